@@ -1,5 +1,8 @@
 import asyncio
+import sys
+
 import today
 
 if __name__ == "__main__":
-    asyncio.run(today.main())
\ No newline at end of file
+    if not asyncio.run(today.main()):
+        sys.exit(today.NO_CHANGES_EXIT_CODE)
\ No newline at end of file
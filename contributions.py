@@ -0,0 +1,103 @@
+import datetime
+
+from storage import read_json, write_json
+
+CALENDAR_DAYS = 366 # the streak is looked up over the last year
+CALENDAR_REFRESH_DAYS = 3 # trailing days that can still change (late pushes, timezones, repos made public)
+
+
+def calendar_days(calendar):
+    """
+    Flattens a contributionCalendar { weeks { contributionDays { date contributionCount } } } into a
+    {'YYYY-MM-DD': count} dict
+    """
+    days = {}
+    for week in calendar['weeks']:
+        for day in week['contributionDays']:
+            days[day['date']] = day['contributionCount']
+    return days
+
+
+def current_streak(days, today):
+    """
+    Returns the number of consecutive days with contributions, ending today
+    Today doesn't break the streak while it has no contributions yet
+    """
+    streak = 0
+    for date in sorted(days, reverse=True):
+        day_date = datetime.date.fromisoformat(date)
+        if day_date > today:
+            continue
+        if days[date] > 0:
+            streak += 1
+        elif day_date != today:
+            break
+    return streak
+
+
+def load_calendar(filename):
+    """
+    Returns the {'YYYY-MM-DD': count} days saved by the previous run, or an empty dict
+    """
+    return read_json(filename, {}).get('days', {})
+
+
+def save_calendar(filename, days):
+    write_json(filename, {'days': days})
+
+
+def calendar_start(days, today):
+    """
+    Returns the first date that has to be queried
+    Only the trailing CALENDAR_REFRESH_DAYS of the saved calendar can still change, older days are kept as they are
+    Without a saved calendar (or one older than the window) the whole CALENDAR_DAYS window is queried
+    """
+    window_start = today - datetime.timedelta(days=CALENDAR_DAYS - 1)
+    if not days:
+        return window_start
+    return max(window_start, datetime.date.fromisoformat(max(days)) - datetime.timedelta(days=CALENDAR_REFRESH_DAYS - 1))
+
+
+def merge_calendar(days, fresh_days, today):
+    """
+    Returns the saved days updated with the freshly queried ones, without the days that fell out of the window
+    """
+    window_start = (today - datetime.timedelta(days=CALENDAR_DAYS - 1)).isoformat()
+    merged = {date: count for date, count in days.items() if date >= window_start}
+    merged.update((date, count) for date, count in fresh_days.items() if date >= window_start)
+    return merged
+
+
+def window_total(days, today, length):
+    """
+    Returns the contributions of the last length days, today included
+    """
+    start = (today - datetime.timedelta(days=length - 1)).isoformat()
+    end = today.isoformat()
+    return sum(count for date, count in days.items() if start <= date <= end)
+
+
+def load_year_totals(filename):
+    """
+    Returns the {'YYYY': total} contribution totals of the closed years saved by previous runs
+    """
+    return read_json(filename, {}).get('years', {})
+
+
+def save_year_totals(filename, totals):
+    write_json(filename, {'years': totals})
+
+
+def year_is_closed(year, today):
+    """
+    A year's total can't change anymore once its last day is out of the CALENDAR_REFRESH_DAYS window
+    """
+    return today - datetime.timedelta(days=CALENDAR_REFRESH_DAYS) >= datetime.date(year, 12, 31)
+
+
+def years_to_query(totals, first_year, today):
+    """
+    Returns the years between first_year and today whose totals have to be queried: the open ones,
+    and the closed ones that aren't saved yet
+    """
+    return [year for year in range(first_year, today.year + 1) if str(year) not in totals or not year_is_closed(year, today)]
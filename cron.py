@@ -0,0 +1,79 @@
+import datetime
+
+FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7), # 0 and 7 are both Sunday
+)
+MAX_SEARCH_YEARS = 5 # an expression like '0 0 30 2 *' never matches
+
+
+def parse_field(field, low, high):
+    """
+    Parses one cron field ('*', '5', '1-5', '*/15', '10-40/10' or a comma-separated list of those)
+    Returns the set of matching values
+    """
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = int(part)
+            end = high if step != 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Invalid cron field {field!r}, values must be between {low} and {high}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A standard 5-field cron expression (minute hour day month weekday)
+    Like cron, a restricted day and weekday match when either of them matches
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != len(FIELDS):
+            raise ValueError(f'Invalid cron expression {expression!r}, expected 5 fields')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_field(field, low, high) for field, (_, low, high) in zip(fields, FIELDS)
+        )
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.day_restricted = not fields[2].startswith('*')
+        self.weekday_restricted = not fields[4].startswith('*')
+
+    def matches_day(self, date):
+        day = date.day in self.days
+        weekday = (date.weekday() + 1) % 7 in self.weekdays # cron counts from Sunday
+        if self.day_restricted and self.weekday_restricted:
+            return day or weekday
+        return day and weekday
+
+    def next_after(self, moment):
+        """
+        Returns the first matching minute strictly after moment
+        """
+        moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = moment + datetime.timedelta(days=366 * MAX_SEARCH_YEARS)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += datetime.timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression {self.expression!r} never matches')
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+import os
+
+from loguru import logger
+
+from cron import CronSchedule
+import storage
+import today
+
+LOCK_DIR = '/tmp/metrics-generator.lock' # shared with run.sh, so a cron run and a daemon run never overlap
+APP_DIR = os.getcwd() # today.main moves into METRICS_DATA_DIR when it is set, run.sh always runs from here
+RUN_SCRIPT = './run.sh'
+
+
+async def run_script(mode):
+    """
+    Runs one run.sh stage (pull or push), raising an Exception if it fails
+    """
+    process = await asyncio.create_subprocess_exec(RUN_SCRIPT, mode, cwd=APP_DIR)
+    if await process.wait() != 0:
+        raise Exception(f'run.sh {mode} has failed with exit code {process.returncode}')
+
+
+async def run_once(client):
+    """
+    One scheduled run: pull the target repository, generate the metrics in-process and push them if they changed
+    Skips the run if another one (from this daemon or from run.sh) still holds the lock
+    """
+    try:
+        os.mkdir(LOCK_DIR)
+    except FileExistsError:
+        logger.warning('Another metrics run is already in progress, skipping.')
+        return
+    try:
+        await run_script('pull')
+        try:
+            changed = await today.main(client)
+        except Exception:
+            logger.exception('Metrics run failed, pushing its cache so LOC crawl checkpoints are kept')
+            storage.forget_loaded()
+            changed = True
+        if changed:
+            await run_script('push')
+        else:
+            logger.info('Metrics are unchanged, nothing to push.')
+    except Exception:
+        logger.exception('Metrics run failed')
+    finally:
+        os.rmdir(LOCK_DIR)
+
+
+async def serve(schedule):
+    """
+    Runs the metrics generator on schedule for as long as the process lives
+    The process, its imports, the GitHub client (with its open connections and rate limit state) and the cache files
+    written by the last run are kept between runs
+    """
+    today.load_config()
+    storage.keep_loaded()
+    async with today.github_client() as client:
+        while True:
+            now = datetime.datetime.now()
+            next_run = schedule.next_after(now)
+            logger.info('Next metrics run at {next_run}', next_run=next_run)
+            await asyncio.sleep((next_run - now).total_seconds())
+            await run_once(client)
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(CronSchedule(os.environ.get('CRON_SCHEDULE', '*/30 * * * *'))))
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+
+from storage import read_json, write_json
+
+FINGERPRINT_VERSION = 1
+
+
+def fingerprint(*inputs):
+    """
+    Returns a stable hash of the inputs a block is rendered from (anything JSON serializable)
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def file_digest(filename):
+    """
+    Returns the sha256 of a file's content, or None if it does not exist
+    """
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def directory_digests(directory):
+    """
+    Returns {path: sha256} of the files under directory, skipping the temp files of storage.write_json
+    """
+    digests = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if not filename.endswith('.tmp'):
+                path = os.path.join(dirpath, filename)
+                digests[path] = file_digest(path)
+    return digests
+
+
+def load_fingerprints(filename):
+    """
+    Returns {'files': {filename: {'digest', 'blocks'}}}, the block fingerprints each file was last written with
+    """
+    fingerprints = read_json(filename)
+    if fingerprints is None or fingerprints.get('version') != FINGERPRINT_VERSION:
+        return {'version': FINGERPRINT_VERSION, 'files': {}}
+    return fingerprints
+
+
+def save_fingerprints(filename, fingerprints):
+    write_json(filename, fingerprints)
+
+
+def stale_blocks(fingerprints, filename, blocks):
+    """
+    Returns the names of the blocks ({name: fingerprint}) whose inputs changed since filename was last written
+    All of them are stale if the file itself changed since then (e.g. a new template was pulled)
+    """
+    recorded = fingerprints['files'].get(filename)
+    if recorded is None or recorded['digest'] != file_digest(filename):
+        return set(blocks)
+    return {name for name, value in blocks.items() if recorded['blocks'].get(name) != value}
+
+
+def record_file(fingerprints, filename, blocks):
+    """
+    Records that filename was just written from blocks
+    """
+    fingerprints['files'][filename] = {'digest': file_digest(filename), 'blocks': dict(blocks)}
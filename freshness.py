@@ -0,0 +1,52 @@
+import time
+
+from storage import read_json, write_json
+
+METRICS = ('profile', 'repositories', 'lastfm', 'ascii')
+STATE_VERSION = 3
+
+
+def parse_ttls(value):
+    """
+    Parses 'metric=seconds,...' (e.g. 'repositories=3600,profile=1800') into {metric: seconds}
+    Metrics that aren't listed get a TTL of 0, so they are refreshed on every run
+    """
+    ttls = dict.fromkeys(METRICS, 0)
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        metric, seconds = item.split('=')
+        if metric.strip() not in ttls:
+            raise ValueError(f'Unknown metric {metric.strip()!r} in METRICS_TTL, expected one of {", ".join(METRICS)}')
+        ttls[metric.strip()] = int(seconds)
+    return ttls
+
+
+def load_state(filename):
+    """
+    Returns the {metric: {'fetched_at', 'value'}} values saved by previous runs
+    Values saved by another version (e.g. rendered SVG instead of the block inputs, or stats without loc_net) are dropped
+    """
+    state = read_json(filename, {})
+    if state.get('version') != STATE_VERSION:
+        return {'version': STATE_VERSION}
+    return state
+
+
+def save_state(filename, state):
+    write_json(filename, state)
+
+
+async def refresh(state, metric, ttl, fetch, now=None):
+    """
+    Returns the stored value of metric while it is younger than ttl seconds, otherwise awaits fetch() and stores its result
+    Returns the value and whether it was fetched
+    A metric without a TTL is stored with fetched_at 0, so the saved state only changes when one of its values does
+    """
+    now = time.time() if now is None else now
+    entry = state.get(metric)
+    if entry is not None and now - entry['fetched_at'] < ttl:
+        return entry['value'], False
+    value = await fetch()
+    state[metric] = {'fetched_at': now if ttl > 0 else 0, 'value': value}
+    return value, True
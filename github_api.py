@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import json
+import time
+
+from loguru import logger
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError: # orjson is optional, the stdlib decoder is only slower
+    json_loads = json.loads
+
+API_URL = 'https://api.github.com/'
+GRAPHQL_TIMEOUT = 60 # seconds, a page of commit history with additions/deletions can take a while to compute
+REST_TIMEOUT = 30
+RATE_LIMIT_FIELDS = '''
+    rateLimit {
+        cost
+        limit
+        remaining
+        resetAt
+    }'''
+SECONDARY_LIMIT_PAUSE = 60 # seconds to back off after a secondary (abuse) limit without a Retry-After header
+MAX_RATE_LIMIT_RETRIES = 5
+
+
+async def paginate(request, query, variables, connection_path, cursor=None):
+    """
+    Iterates over a cursor-paginated GraphQL connection, yielding one page (the connection object) at a time
+    request is a coroutine function taking (query, variables) and returning the decoded response
+    The query must take a $cursor variable; connection_path leads from the response to the connection
+    Stops without yielding if any step of connection_path is null (e.g. a repository without a default branch)
+    """
+    while True:
+        connection = await request(query, dict(variables, cursor=cursor))
+        for key in connection_path:
+            connection = connection.get(key) if connection is not None else None
+        if connection is None:
+            return
+        yield connection
+        if not connection['pageInfo']['hasNextPage']:
+            return
+        cursor = connection['pageInfo']['endCursor']
+
+
+class RateLimiter:
+    """
+    Adaptive concurrency limit for GitHub API requests (AIMD: +1 slot per window of successful requests,
+    halved on every rate-limit response)
+    Reads X-RateLimit-Remaining / X-RateLimit-Reset, Retry-After and the GraphQL rateLimit { limit remaining resetAt } block:
+    an exhausted budget pauses every request until the reset instead of failing, and a low budget spreads the
+    remaining requests evenly over the time left before the reset
+    """
+
+    def __init__(self, concurrency=4, max_concurrency=16, clock=time.time, sleep=asyncio.sleep):
+        self.concurrency = float(max(1, concurrency))
+        self.max_concurrency = max(self.concurrency, max_concurrency)
+        self.active = 0
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.paused_until = 0.0
+        self.next_start = 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < int(self.concurrency))
+            self.active += 1
+        await self.wait_for_budget()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    async def wait_for_budget(self):
+        """
+        Sleeps until a paused limiter resets, or until this request's share of a low budget comes up
+        """
+        while True:
+            now = self.clock()
+            start = max(self.paused_until, self.next_start, now)
+            if start <= now:
+                break
+            await self.sleep(start - now)
+        if self.remaining is not None and self.reset_at is not None and self.low_budget():
+            self.next_start = now + max(0.0, self.reset_at - now) / max(1, self.remaining)
+
+    def low_budget(self):
+        return self.limit is not None and self.remaining < self.limit * 0.1
+
+    def update(self, status, headers, body=None):
+        """
+        Records the rate limit state of a response
+        Returns True if the request was rate limited and should be retried (once the limiter lets it through again)
+        """
+        now = self.clock()
+        if headers.get('X-RateLimit-Remaining') is not None:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset_at = float(headers.get('X-RateLimit-Reset') or now)
+            if headers.get('X-RateLimit-Limit') is not None:
+                self.limit = int(headers['X-RateLimit-Limit'])
+        rate_limit = (body.get('data') or {}).get('rateLimit') if isinstance(body, dict) else None
+        if rate_limit:
+            self.limit = rate_limit['limit']
+            self.remaining = rate_limit['remaining']
+            self.reset_at = datetime.datetime.fromisoformat(rate_limit['resetAt'].replace('Z', '+00:00')).timestamp()
+
+        if isinstance(body, dict):
+            limited = any(error.get('type') == 'RATE_LIMITED' for error in body.get('errors') or [])
+        else: # a 403 is only a rate limit if GitHub says so, otherwise it is a permission error
+            limited = status == 429 or (status == 403 and (headers.get('Retry-After') is not None or self.remaining == 0 or 'rate limit' in (body or '').lower()))
+        if limited:
+            if headers.get('Retry-After') is not None:
+                pause = now + float(headers['Retry-After'])
+            elif self.remaining == 0 and self.reset_at is not None:
+                pause = self.reset_at
+            else:
+                pause = now + SECONDARY_LIMIT_PAUSE
+            self.paused_until = max(self.paused_until, pause)
+            self.concurrency = max(1.0, self.concurrency / 2)
+            logger.warning('GitHub rate limit hit, pausing {seconds:.0f}s with concurrency {concurrency}', seconds=self.paused_until - now, concurrency=int(self.concurrency))
+            return True
+        if self.remaining == 0 and self.reset_at is not None:
+            self.paused_until = max(self.paused_until, self.reset_at)
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        return False
+
+
+def client_timeout(seconds):
+    """
+    Returns the aiohttp timeout for one request
+    """
+    import aiohttp
+    return aiohttp.ClientTimeout(total=seconds)
+
+
+def transient_errors():
+    """
+    Returns the exception types of a failed request worth retrying (a timeout or a dropped connection)
+    """
+    import aiohttp
+    return asyncio.TimeoutError, aiohttp.ClientError
+
+
+class GitHubClient:
+    """
+    The one HTTP client of a run: a pooled keep-alive connection per host, gzip, the access token, the proxy,
+    per-request timeouts, the rate limiter and the JSON decoder (orjson when it is installed) all live here
+    Use as an async context manager, the connection pool is opened on enter and closed on exit
+    """
+
+    def __init__(self, token, proxy=None, limiter=None, connections_per_host=8, api_url=API_URL):
+        self.api_url = api_url
+        self.headers = {'authorization': 'token ' + token, 'Accept-Encoding': 'gzip'}
+        self.proxy = proxy
+        self.limiter = limiter or RateLimiter()
+        self.rest_limiter = RateLimiter() # the REST API has a budget of its own
+        self.connections_per_host = connections_per_host
+        self.session = None
+
+    async def __aenter__(self):
+        import aiohttp # loaded with the first client, importing this module for RateLimiter or paginate stays cheap
+        connector = aiohttp.TCPConnector(limit_per_host=self.connections_per_host, ttl_dns_cache=300, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, proxy=self.proxy)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def get(self, url, headers=None, timeout=REST_TIMEOUT):
+        """
+        Returns the aiohttp request context manager for a GET, the token is only sent to the GitHub API
+        """
+        if url.startswith(self.api_url):
+            headers = dict(self.headers, **(headers or {}))
+        return self.session.get(url, headers=headers, timeout=client_timeout(timeout))
+
+    async def rest(self, method, path, json=None, timeout=REST_TIMEOUT):
+        """
+        Sends one REST API request (path is relative to the API root, e.g. 'repos/owner/name/git/blobs')
+        Returns the decoded body, or raises an Exception if the response does not succeed
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            async with self.rest_limiter:
+                async with self.session.request(method, self.api_url + path, json=json, headers=self.headers,
+                                                timeout=client_timeout(timeout)) as response:
+                    status = response.status
+                    body = await response.json(loads=json_loads) if status < 300 else await response.text()
+                    limited = self.rest_limiter.update(status, response.headers, None if status < 300 else body)
+            if not limited or attempt == MAX_RATE_LIMIT_RETRIES:
+                break
+        if status >= 300:
+            raise Exception(method, path, 'has failed with a', status, body)
+        return body
+
+    async def graphql(self, query, variables, timeout=GRAPHQL_TIMEOUT):
+        """
+        Sends one GraphQL request through the rate limiter, waiting out rate limits instead of failing
+        Returns the status and the decoded body (the response text if the status isn't 200)
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            async with self.limiter:
+                async with self.session.post(self.api_url + 'graphql', json={'query': query, 'variables': variables}, headers=self.headers,
+                                             timeout=client_timeout(timeout)) as response:
+                    status = response.status
+                    body = await response.json(loads=json_loads) if status == 200 else await response.text()
+                    limited = self.limiter.update(status, response.headers, body)
+            if not limited or attempt == MAX_RATE_LIMIT_RETRIES:
+                return status, body
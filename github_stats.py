@@ -32,7 +32,7 @@ def justify_text(new_text, length=0, use_k=False):
     return dot_string, new_text
 
 
-def generate_github_stats_svg(x, y, fill_color, commit_data, star_data, repo_data, contrib_data, follower_data, loc_total, loc_add, loc_del, recent_commit_data=None, streak_data=None):
+def generate_github_stats_svg(x, y, fill_color, commit_data, star_data, repo_data, contrib_data, follower_data, loc_total, loc_add, loc_del, recent_commit_data=None, streak_data=None, lifetime_contrib_data=None):
     repo_dots, repo_val = justify_text(repo_data, 6)
     star_dots, star_val = justify_text(star_data, 14)
     commit_dots, commit_val = justify_text(commit_data, 23)
@@ -66,6 +66,15 @@ def generate_github_stats_svg(x, y, fill_color, commit_data, star_data, repo_dat
 
     y_pos_base = y + 80 if (recent_commit_data is not None or streak_data is not None) else y + 60
 
+    row2_plain = f". Commits:{commit_dots}{commit_val} | Followers:{follower_dots}{follower_val}"
+    limit = len(row2_plain)
+
+    if lifetime_contrib_data is not None:
+        lifetime_label_plain = '. Contributions (all time):'
+        lifetime_dots, lifetime_val = justify_text(lifetime_contrib_data, limit - len(lifetime_label_plain) - 2, True)
+        svg += f'\n    <tspan x="{x}" y="{y_pos_base}" class="cc">. </tspan><tspan class="key">Contributions (all time)</tspan>:<tspan class="cc" id="lifetime_contrib_dots">{lifetime_dots}</tspan><tspan class="value" id="lifetime_contrib_data">{lifetime_val}</tspan>'
+        y_pos_base += 20
+
     loc_total_int = int(str(loc_total).replace(',', ''))
     loc_add_int = int(str(loc_add).replace(',', ''))
     loc_del_int = int(str(loc_del).replace(',', ''))
@@ -79,8 +88,6 @@ def generate_github_stats_svg(x, y, fill_color, commit_data, star_data, repo_dat
     k_del = f"{loc_del_int // 1000:,}k"
 
     loc_label_plain = '. Lines of Code on GitHub:'
-    row2_plain = f". Commits:{commit_dots}{commit_val} | Followers:{follower_dots}{follower_val}"
-    limit = len(row2_plain)
 
     candidates = []
     variants = [
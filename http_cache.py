@@ -0,0 +1,43 @@
+import hashlib
+import os
+
+from github_api import json_loads
+from storage import read_json, write_json
+
+HTTP_CACHE_DIR = 'cache/http'
+
+
+def cache_path(url, cache_dir=HTTP_CACHE_DIR):
+    """
+    Returns the file holding the validators and body stored for url
+    The URL is hashed, so query-string secrets (API keys) never end up in the cache directory
+    """
+    return os.path.join(cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+async def get_json(client, url, headers=None, cache_dir=HTTP_CACHE_DIR):
+    """
+    GETs url through client (a github_api.GitHubClient) and returns the decoded JSON body, or raises an Exception
+    if the response does not succeed
+    Sends the ETag / Last-Modified validators stored by the previous call, a 304 Not Modified is answered from the
+    stored body (on GitHub's REST API, 304s don't count against the rate limit)
+    """
+    filename = cache_path(url, cache_dir)
+    stored = read_json(filename)
+    request_headers = dict(headers or {})
+    if stored is not None:
+        if stored['etag']:
+            request_headers['If-None-Match'] = stored['etag']
+        if stored['last_modified']:
+            request_headers['If-Modified-Since'] = stored['last_modified']
+    async with client.get(url, headers=request_headers) as response:
+        if response.status == 304 and stored is not None:
+            return stored['body']
+        if response.status == 200:
+            body = await response.json(loads=json_loads)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                write_json(filename, {'etag': etag, 'last_modified': last_modified, 'body': body})
+            return body
+        raise Exception(response.status, await response.text())
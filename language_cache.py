@@ -0,0 +1,70 @@
+from storage import read_json, write_json
+
+LANGUAGE_CACHE_VERSION = 1
+LANGUAGES_PER_REPO = 10
+
+LANGUAGE_FIELDS = f'''
+        languages(first: {LANGUAGES_PER_REPO}, orderBy: {{field: SIZE, direction: DESC}}) {{
+            edges {{
+                size
+                node {{
+                    name
+                    color
+                }}
+            }}
+        }}'''
+
+
+def load_language_cache(filename):
+    """
+    Loads the per-repository language cache, or returns an empty one
+    """
+    cache = read_json(filename)
+    if cache is None or cache.get('version') != LANGUAGE_CACHE_VERSION:
+        return {'version': LANGUAGE_CACHE_VERSION, 'repos': {}}
+    return cache
+
+
+def save_language_cache(filename, cache):
+    write_json(filename, cache)
+
+
+def sync_repos(cache, nodes):
+    """
+    Matches the cache to the current repository nodes by GraphQL node id, dropping repos that are gone
+    Language sizes only change when a repository is pushed, so a repo is stale when its pushedAt
+    differs from the one its languages were fetched at
+    Returns the stale nodes
+    """
+    previous = cache['repos']
+    repos = {}
+    stale = []
+    for node in nodes:
+        entry = previous.get(node['id'])
+        if entry is not None:
+            entry['name'] = node['nameWithOwner']
+            repos[node['id']] = entry
+        if entry is None or entry['pushed_at'] != node['pushedAt']:
+            stale.append(node)
+    cache['repos'] = repos
+    return stale
+
+
+def build_languages_batch_query(nodes):
+    """
+    Builds one aliased GraphQL query (r0: repository(...) { languages ... } r1: ...) fetching the languages of every node
+    Returns the query and its variables
+    """
+    declarations = []
+    selections = []
+    variables = {}
+    for index, node in enumerate(nodes):
+        owner, name = node['nameWithOwner'].split('/')
+        declarations.append(f'$owner{index}: String!, $name{index}: String!')
+        selections.append(f'''
+    r{index}: repository(owner: $owner{index}, name: $name{index}) {{{LANGUAGE_FIELDS}
+    }}''')
+        variables[f'owner{index}'] = owner
+        variables[f'name{index}'] = name
+    query = 'query (' + ', '.join(declarations) + ') {' + ''.join(selections) + '\n}'
+    return query, variables
@@ -1,6 +1,3 @@
-import asyncio
-
-from loguru import logger
 from svg_header import make_header_tail
 
 LANGUAGE_COLORS = {
@@ -53,59 +50,31 @@ def human_readable_size(size_in_bytes):
     return f"{size_in_bytes:.1f}PB"
 
 
-async def get_most_used_languages(session, user_name, headers, excluded_repos=None, owner_affiliation=['OWNER'], excluded_languages=None):
-    if excluded_repos is None:
-        excluded_repos = []
+def repository_languages(languages):
+    """
+    Converts a GraphQL languages connection (edges { size node { name color } }) into {name: {'size', 'color'}}
+    """
+    return {edge['node']['name']: {'size': edge['size'], 'color': edge['node']['color']} for edge in languages['edges']}
+
+
+def get_most_used_languages(repositories, excluded_languages=None):
+    """
+    Sums the language sizes of repositories (one repository_languages dict per repo, already filtered by the caller)
+    and returns the top 5 languages with their share and color
+    GitHub's own language color is used, LANGUAGE_COLORS only covers languages GitHub has no color for
+    """
     if excluded_languages is None:
         excluded_languages = []
     else:
         excluded_languages = [lang.lower() for lang in excluded_languages]
 
-    if excluded_repos is None:
-        excluded_repos = []
-
-    repos = []
-    cursor = None
-    while True:
-        query = '''
-        query ($owner_affiliation: [RepositoryAffiliation], $login: String!, $cursor: String) {
-            user(login: $login) {
-                repositories(first: 100, after: $cursor, ownerAffiliations: $owner_affiliation) {
-                    edges {
-                        node {
-                            ... on Repository {
-                                nameWithOwner
-                            }
-                        }
-                    }
-                    pageInfo {
-                        endCursor
-                        hasNextPage
-                    }
-                }
-            }
-        }'''
-        variables = {'owner_affiliation': owner_affiliation, 'login': user_name, 'cursor': cursor}
-        async with session.post('https://api.github.com/graphql', json={'query': query, 'variables': variables}, headers=headers) as response:
-            if response.status != 200:
-                raise Exception(f'Failed to fetch repos: {response.status}')
-            data = await response.json()
-            repos.extend([edge['node']['nameWithOwner'] for edge in data['data']['user']['repositories']['edges']])
-            if not data['data']['user']['repositories']['pageInfo']['hasNextPage']:
-                break
-            cursor = data['data']['user']['repositories']['pageInfo']['endCursor']
-
-    repos = [repo for repo in repos if repo not in excluded_repos]
-
     language_bytes = {}
-    for repo in repos:
-        owner, name = repo.split('/')
-        async with session.get(f'https://api.github.com/repos/{owner}/{name}/languages', headers=headers) as response:
-            logger.debug("Fetched languages for {owner}/{repo}: {payload}", owner=owner, repo=name, payload=await response.json())
-            if response.status == 200:
-                langs = await response.json()
-                for lang, bytes_count in langs.items():
-                    language_bytes[lang] = language_bytes.get(lang, 0) + bytes_count
+    language_colors = {}
+    for languages in repositories:
+        for lang, stats in languages.items():
+            language_bytes[lang] = language_bytes.get(lang, 0) + stats['size']
+            if stats['color']:
+                language_colors[lang] = stats['color']
 
     sorted_langs = sorted(language_bytes.items(), key=lambda x: x[1], reverse=True)
 
@@ -117,7 +86,7 @@ async def get_most_used_languages(session, user_name, headers, excluded_repos=No
     languages = []
     for lang, bytes_count in top_langs:
         percentage = (bytes_count / total_bytes) * 100 if total_bytes > 0 else 0
-        color = LANGUAGE_COLORS.get(lang, '#cccccc')
+        color = language_colors.get(lang) or LANGUAGE_COLORS.get(lang, '#cccccc')
         languages.append({
             'name': lang,
             'color': color,
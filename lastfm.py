@@ -2,6 +2,7 @@ import traceback
 from datetime import datetime
 from typing import Dict, List, Any
 
+from http_cache import get_json
 from svg_header import make_header_tail
 
 
@@ -44,6 +45,27 @@ def escape_xml(text):
             .replace('"', '&quot;')
             .replace("'", '&apos;'))
 
+def scrobble_age(last_scrobble_date, now=None):
+    try:
+        last_date = datetime.strptime(last_scrobble_date, '%d %b %Y, %H:%M')
+        now = now or datetime.now()
+        delta = now - last_date
+
+        if delta.days >= 1:
+            days = delta.days
+            return f"{days} day{'s' if days != 1 else ''} ago"
+        elif delta.seconds >= 3600:
+            hours = delta.seconds // 3600
+            return f"{hours} hour{'s' if hours != 1 else ''} ago"
+        elif delta.seconds >= 60:
+            minutes = delta.seconds // 60
+            return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+        else:
+            return "just now"
+    except ValueError:
+        traceback.print_exc()
+        return "unknown"
+
 def generate_lastfm_svg(scrobbles, start_x=390, start_y=60, max_line_length=60):
     svg_parts = []
 
@@ -98,25 +120,7 @@ def generate_lastfm_svg(scrobbles, start_x=390, start_y=60, max_line_length=60):
     total_scrobbles = summary.get("total_scrobbles", 0)
     last_scrobble_date = summary.get("last_scrobble_date")
     if total_scrobbles > 0 and last_scrobble_date:
-        try:
-            last_date = datetime.strptime(last_scrobble_date, '%d %b %Y, %H:%M')
-            now = datetime.now()
-            delta = now - last_date
-
-            if delta.days >= 1:
-                days = delta.days
-                ago = f"{days} day{'s' if days != 1 else ''} ago"
-            elif delta.seconds >= 3600:
-                hours = delta.seconds // 3600
-                ago = f"{hours} hour{'s' if hours != 1 else ''} ago"
-            elif delta.seconds >= 60:
-                minutes = delta.seconds // 60
-                ago = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-            else:
-                ago = "just now"
-        except ValueError:
-            traceback.print_exc()
-            ago = "unknown"
+        ago = scrobble_age(last_scrobble_date)
 
         number_str = str(total_scrobbles)
         len_number = len(number_str)
@@ -149,14 +153,10 @@ def generate_lastfm_svg(scrobbles, start_x=390, start_y=60, max_line_length=60):
 
     return '\n'.join(svg_parts)
 
-async def parse_lastfm(session, api_key, user):
+async def parse_lastfm(client, api_key, user):
     url = f'http://ws.audioscrobbler.com/2.0/?method=user.getrecenttracks&user={user}&api_key={api_key}&format=json&limit=5&extended=1'
-    async with session.get(url) as response:
-        if response.status == 200:
-            return await response.json()
-        raise Exception(response.status, await response.text())
-
-async def lastfm_getter(session, api_key, user):
-    data = await parse_lastfm(session, api_key, user)
-    scrobbles = parse_tracks(data)
-    return generate_lastfm_svg(scrobbles)
+    return await get_json(client, url)
+
+async def lastfm_getter(client, api_key, user):
+    data = await parse_lastfm(client, api_key, user)
+    return parse_tracks(data)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+
+from storage import read_json, write_json
+
+CACHE_VERSION = 1
+LEGACY_COMMENT_LINE = 'This line is a comment block. Write whatever you want here.\n'
+
+
+def repo_hash(name_with_owner):
+    """
+    Hash used to identify a repository in the legacy text cache
+    """
+    return hashlib.sha256(name_with_owner.encode('utf-8')).hexdigest()
+
+
+def empty_entry(name_with_owner):
+    return {
+        'name': name_with_owner,
+        'branch_oid': None,
+        'my_commits': 0,
+        'additions': 0,
+        'deletions': 0,
+        'head_oid': None,
+    }
+
+
+def parse_legacy_row(line):
+    """
+    Parses one 'hash commit_count my_commits additions deletions [head_oid]' line of the text cache
+    """
+    repo_id, commit_count, my_commits, additions, deletions, *head_oid = line.split()
+    return repo_id, {
+        'name': None,
+        'branch_oid': None, # the text cache tracked history.totalCount, so every migrated row is checked once
+        'my_commits': int(my_commits),
+        'additions': int(additions),
+        'deletions': int(deletions),
+        'head_oid': head_oid[0] if head_oid else None,
+    }
+
+
+def migrate_legacy_cache(legacy_filename, comment_size):
+    """
+    Reads the positional text cache into the keyed layout
+    Rows are only known by the hash of nameWithOwner, so they are kept under 'legacy' until
+    sync_repos can match them to a node id
+    """
+    with open(legacy_filename, 'r') as f:
+        lines = f.readlines()
+    legacy = {}
+    for line in lines[comment_size:]:
+        if line.strip():
+            repo_id, entry = parse_legacy_row(line)
+            legacy[repo_id] = entry
+    return {'version': CACHE_VERSION, 'comment': lines[:comment_size], 'repos': {}, 'legacy': legacy}
+
+
+def load_loc_cache(filename, legacy_filename=None, comment_size=0):
+    """
+    Loads the keyed LOC cache, migrating the legacy text cache on first use
+    Returns a fresh cache (with a placeholder comment block) if neither file exists
+    """
+    cache = read_json(filename)
+    if cache is not None and cache.get('version') == CACHE_VERSION:
+        cache.setdefault('legacy', {})
+        return cache
+    if legacy_filename and os.path.exists(legacy_filename):
+        return migrate_legacy_cache(legacy_filename, comment_size)
+    return {'version': CACHE_VERSION, 'comment': [LEGACY_COMMENT_LINE] * comment_size, 'repos': {}, 'legacy': {}}
+
+
+def save_loc_cache(filename, cache):
+    """
+    Writes the cache atomically (temp file + rename), so a crash never leaves a half-written file
+    Unmatched legacy rows are dropped once a keyed cache has been written
+    """
+    write_json(filename, {key: value for key, value in cache.items() if key != 'legacy'})
+
+
+def sync_repos(cache, edges):
+    """
+    Matches the cache to the current repository list by GraphQL node id
+    Renamed repos keep their rows, new repos get an empty row and repos that are gone are dropped
+    Returns the cache entries in edge order and the number of newly added repositories
+    """
+    legacy = cache.get('legacy', {})
+    previous = cache['repos']
+    repos = {}
+    entries = []
+    added = 0
+    for edge in edges:
+        node = edge['node']
+        entry = previous.get(node['id']) or legacy.pop(repo_hash(node['nameWithOwner']), None)
+        if entry is None:
+            entry = empty_entry(node['nameWithOwner'])
+            added += 1
+        entry['name'] = node['nameWithOwner']
+        entry.pop('commit_count', None) # replaced by branch_oid
+        entry.setdefault('branch_oid', None)
+        entry.pop('pushed_at', None) # language_cache tracks pushedAt, the LOC stage goes by branch_oid
+        repos[node['id']] = entry
+        entries.append(entry)
+    cache['repos'] = repos
+    return entries, added
+
+
+class LocAggregate:
+    """
+    LOC and commit totals over the counted repositories, computed in a single pass over their cache entries
+    Shared by the lines-of-code stats and the commit total, so neither has to re-read the cache file
+    """
+
+    def __init__(self, rows, cached):
+        self.cached = cached
+        self.additions = 0
+        self.deletions = 0
+        self.my_commits = 0
+        for entry in rows:
+            self.additions += entry['additions']
+            self.deletions += entry['deletions']
+            self.my_commits += entry['my_commits']
+
+    @property
+    def net(self):
+        return self.additions - self.deletions
@@ -0,0 +1,176 @@
+from github_api import RATE_LIMIT_FIELDS
+
+HISTORY_PAGE_SIZE = 100
+INCREMENTAL_PAGE_SIZE = 10 # first page of an incremental crawl, most refreshes only have a handful of new commits
+
+# Pages come from history(author: {id: ...}), so GitHub only returns my own commits
+HISTORY_FIELDS = '''
+                        edges {
+                            node {
+                                oid
+                                additions
+                                deletions
+                            }
+                        }
+                        pageInfo {
+                            endCursor
+                            hasNextPage
+                        }'''
+
+
+class RepoCrawl:
+    """
+    Running LOC totals for one repository while my commits on its default branch are paged through
+    If last_oid (the newest commit counted last time) is set, the crawl stops there, so only newer commits are counted
+    """
+
+    def __init__(self, name_with_owner, last_oid=None, page_size=HISTORY_PAGE_SIZE, branch_oid=None):
+        self.name_with_owner = name_with_owner
+        self.owner, self.name = name_with_owner.split('/')
+        self.last_oid = last_oid
+        self.page_size = page_size
+        self.cursor = None
+        self.additions = 0
+        self.deletions = 0
+        self.my_commits = 0
+        self.head_oid = None
+        self.reached_last_oid = False
+        self.empty = False
+        self.done = False
+        self.elapsed = 0.0
+        self.branch_oid = branch_oid # default branch head the crawl was started for
+        self.pages = 0
+        self.resumed = False
+
+    def checkpoint(self):
+        """
+        Returns the state needed to resume this crawl after a crash
+        """
+        return {
+            'cursor': self.cursor,
+            'additions': self.additions,
+            'deletions': self.deletions,
+            'my_commits': self.my_commits,
+            'head_oid': self.head_oid,
+            'last_oid': self.last_oid,
+            'branch_oid': self.branch_oid,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, name_with_owner, checkpoint):
+        """
+        Rebuilds a crawl saved by checkpoint(), it continues from the saved cursor with the saved partial totals
+        """
+        crawl = cls(name_with_owner, last_oid=checkpoint['last_oid'], branch_oid=checkpoint.get('branch_oid'))
+        crawl.cursor = checkpoint['cursor']
+        crawl.additions = checkpoint['additions']
+        crawl.deletions = checkpoint['deletions']
+        crawl.my_commits = checkpoint['my_commits']
+        crawl.head_oid = checkpoint['head_oid']
+        crawl.resumed = True
+        return crawl
+
+    def apply_page(self, history):
+        """
+        Adds one page of (author-filtered) history to the totals
+        history is None when the repository has no default branch (or is gone)
+        """
+        if history is None:
+            self.empty = True
+            self.done = True
+            return
+        self.pages += 1
+        if self.head_oid is None and history['edges']:
+            self.head_oid = history['edges'][0]['node']['oid']
+        for node in history['edges']:
+            if self.last_oid is not None and node['node']['oid'] == self.last_oid:
+                self.reached_last_oid = True
+                self.done = True
+                return
+            self.my_commits += 1
+            self.additions += node['node']['additions']
+            self.deletions += node['node']['deletions']
+        if history['edges'] == [] or not history['pageInfo']['hasNextPage']:
+            self.done = True
+            return
+        self.cursor = history['pageInfo']['endCursor']
+        self.page_size = HISTORY_PAGE_SIZE
+
+
+def expected_page_size(incremental):
+    """
+    Size of the first history page for a repository
+    An incremental crawl usually finds the last counted commit within a few commits of the head
+    """
+    return INCREMENTAL_PAGE_SIZE if incremental else HISTORY_PAGE_SIZE
+
+
+def plan_batches(crawls, max_repos, max_commits):
+    """
+    Packs crawls into batches of at most max_repos repositories and max_commits requested history nodes
+    Commit nodes (with additions/deletions) are what makes a history query expensive for GitHub to compute
+    """
+    batches = []
+    batch = []
+    batch_cost = 0
+    for crawl in crawls:
+        if batch and (len(batch) >= max_repos or batch_cost + crawl.page_size > max_commits):
+            batches.append(batch)
+            batch = []
+            batch_cost = 0
+        batch.append(crawl)
+        batch_cost += crawl.page_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_history_batch_query(crawls, author_id):
+    """
+    Builds one aliased GraphQL query (r0: repository(...) { ... } r1: ...) fetching the next page of
+    author_id's commits for every crawl
+    Returns the query and its variables
+    """
+    declarations = ['$author_id: ID!']
+    selections = []
+    variables = {'author_id': author_id}
+    for index, crawl in enumerate(crawls):
+        declarations.append(f'$owner{index}: String!, $name{index}: String!, $cursor{index}: String')
+        selections.append(f'''
+    r{index}: repository(owner: $owner{index}, name: $name{index}) {{
+        defaultBranchRef {{
+            target {{
+                ... on Commit {{
+                    history(first: {crawl.page_size}, after: $cursor{index}, author: {{id: $author_id}}) {{{HISTORY_FIELDS}
+                    }}
+                }}
+            }}
+        }}
+    }}''')
+        variables[f'owner{index}'] = crawl.owner
+        variables[f'name{index}'] = crawl.name
+        variables[f'cursor{index}'] = crawl.cursor
+    query = 'query (' + ', '.join(declarations) + ') {' + ''.join(selections) + RATE_LIMIT_FIELDS + '\n}'
+    return query, variables
+
+
+def failed_aliases(request):
+    """
+    Returns the aliases (r0, r1, ...) of a batch response whose history page could not be fetched
+    An error on one alias (e.g. a rejected cursor or a timeout) only nulls the nearest nullable field above it:
+    the alias itself, or the target of its defaultBranchRef since Commit.history is non-null
+    """
+    failed = {error['path'][0] for error in request.get('errors') or [] if error.get('path')}
+    for alias, repository in (request.get('data') or {}).items():
+        if repository is None or (repository.get('defaultBranchRef') is not None and repository['defaultBranchRef'].get('target') is None):
+            failed.add(alias)
+    return failed
+
+
+def history_from_repository(repository):
+    """
+    Returns the default-branch history connection of a repository node, or None if it has no default branch
+    """
+    if repository['defaultBranchRef'] is None:
+        return None
+    return repository['defaultBranchRef']['target']['history']
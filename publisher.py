@@ -0,0 +1,159 @@
+"""
+Publishes the generated files without a git clone: pull downloads the published files that changed on the target branch,
+push commits the ones that changed locally through the Git Data API
+Files are only ever added or changed, a file deleted on one side is never deleted on the other
+The branch ref is fetched with its ETag and the tree listing of its head commit is stored, so a run on an unchanged
+branch only sends one conditional GET
+"""
+import asyncio
+import base64
+import datetime
+import hashlib
+import os
+import sys
+
+from loguru import logger
+
+import github_api
+import http_cache
+from storage import read_json, write_json
+
+PUBLISHED_DIRS = ('cache/', 'arts/')
+PUBLISHED_FILES = ('dark_mode.svg', 'light_mode.svg')
+STATE_DIR = '.publisher' # ref validators and the stored tree listing, outside the published files so they are never pushed
+
+
+def is_published(path):
+    """
+    Whether a path of the target repository is one of the files the generator reads and writes
+    """
+    return path in PUBLISHED_FILES or path.startswith(PUBLISHED_DIRS)
+
+
+def blob_sha(data):
+    """
+    Returns the git blob id of data, the same id GitHub reports in a tree, so unchanged files are never uploaded
+    """
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def local_files(root='.'):
+    """
+    Returns {path: content} of the published files under root
+    Temp files left by an interrupted storage.write_json are skipped
+    """
+    files = {}
+    for directory in PUBLISHED_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                with open(path, 'rb') as f:
+                    files[os.path.relpath(path, root).replace(os.sep, '/')] = f.read()
+    for filename in PUBLISHED_FILES:
+        path = os.path.join(root, filename)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                files[filename] = f.read()
+    return files
+
+
+def tree_filename(repository, branch, root='.'):
+    return os.path.join(root, STATE_DIR, hashlib.sha256(f'{repository}@{branch}'.encode('utf-8')).hexdigest() + '.tree.json')
+
+
+def save_tree(repository, branch, root, commit_sha, tree_sha, blobs):
+    """
+    Stores the tree listing of commit_sha, commits are immutable so it is valid for as long as the ref points there
+    """
+    write_json(tree_filename(repository, branch, root), {'commit': commit_sha, 'tree': tree_sha, 'blobs': blobs})
+
+
+async def remote_tree(client, repository, branch, root='.'):
+    """
+    Returns the head commit sha, its tree sha and the {path: blob sha} of the published files on branch
+    The ref is a conditional GET, the commit and its tree are only fetched when the ref moved to a commit not seen before
+    """
+    ref = await http_cache.get_json(client, client.api_url + f'repos/{repository}/git/ref/heads/{branch}', cache_dir=os.path.join(root, STATE_DIR))
+    commit_sha = ref['object']['sha']
+    stored = read_json(tree_filename(repository, branch, root))
+    if stored is not None and stored['commit'] == commit_sha:
+        return commit_sha, stored['tree'], stored['blobs']
+    commit = await client.rest('GET', f'repos/{repository}/git/commits/{commit_sha}')
+    tree = await client.rest('GET', f'repos/{repository}/git/trees/{commit["tree"]["sha"]}?recursive=1')
+    if tree.get('truncated'):
+        logger.warning('The tree of {repository} is too large to be listed in full, some published files may be missing', repository=repository)
+    blobs = {entry['path']: entry['sha'] for entry in tree['tree'] if entry['type'] == 'blob' and is_published(entry['path'])}
+    save_tree(repository, branch, root, commit_sha, commit['tree']['sha'], blobs)
+    return commit_sha, commit['tree']['sha'], blobs
+
+
+async def pull(client, repository, branch, root='.'):
+    """
+    Downloads the published files of branch into root, skipping the ones that are already up to date
+    Blobs are only fetched for files whose content differs, matched by their git blob id
+    Returns the paths that were written
+    """
+    _, _, blobs = await remote_tree(client, repository, branch, root)
+    current = local_files(root)
+    changed = [path for path, sha in blobs.items() if path not in current or blob_sha(current[path]) != sha]
+
+    async def download(path):
+        blob = await client.rest('GET', f'repos/{repository}/git/blobs/{blobs[path]}')
+        filename = os.path.join(root, path)
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(base64.b64decode(blob['content']))
+
+    await asyncio.gather(*(download(path) for path in changed))
+    for directory in PUBLISHED_DIRS:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    logger.info('Pulled {changed} of {total} files from {repository}', changed=len(changed), total=len(blobs), repository=repository)
+    return changed
+
+
+async def push(client, repository, branch, message, author=None, root='.'):
+    """
+    Commits the published files under root to branch through the Git Data API (blobs, a tree, a commit, the ref)
+    Only files whose content differs from the branch head are uploaded, nothing is committed if none do
+    Returns the new commit sha, or None
+    """
+    commit_sha, tree_sha, blobs = await remote_tree(client, repository, branch, root)
+    changed = {path: data for path, data in local_files(root).items() if blobs.get(path) != blob_sha(data)}
+    if not changed:
+        logger.info('No changes to commit')
+        return None
+
+    async def upload(path, data):
+        blob = await client.rest('POST', f'repos/{repository}/git/blobs', {'content': base64.b64encode(data).decode('ascii'), 'encoding': 'base64'})
+        return {'path': path, 'mode': '100644', 'type': 'blob', 'sha': blob['sha']}
+
+    entries = await asyncio.gather(*(upload(path, data) for path, data in changed.items()))
+    tree = await client.rest('POST', f'repos/{repository}/git/trees', {'base_tree': tree_sha, 'tree': list(entries)})
+    commit = {'message': message, 'tree': tree['sha'], 'parents': [commit_sha]}
+    if author:
+        commit['author'] = author
+    new_commit = await client.rest('POST', f'repos/{repository}/git/commits', commit)
+    await client.rest('PATCH', f'repos/{repository}/git/refs/heads/{branch}', {'sha': new_commit['sha']})
+    save_tree(repository, branch, root, new_commit['sha'], tree['sha'], dict(blobs, **{entry['path']: entry['sha'] for entry in entries}))
+    logger.info('Pushed {changed} changed files to {repository} in {sha}', changed=len(changed), repository=repository, sha=new_commit['sha'])
+    return new_commit['sha']
+
+
+async def main(mode):
+    repository = os.environ['TARGET_REPOSITORY']
+    branch = os.environ.get('TARGET_BRANCH') or 'main'
+    root = os.environ.get('METRICS_DATA_DIR') or '.'
+    async with github_api.GitHubClient(os.environ['ACCESS_TOKEN'], os.environ.get('PROXY')) as client:
+        if mode == 'pull':
+            await pull(client, repository, branch, root)
+        elif mode == 'push':
+            author = {'name': os.environ.get('GIT_USER_NAME') or 'GitHub Action', 'email': os.environ.get('GIT_USER_EMAIL') or 'action@github.com'}
+            await push(client, repository, branch, f'Update GitHub metrics [{datetime.datetime.now().ctime()}]', author, root)
+        else:
+            raise SystemExit('Usage: publisher.py pull|push')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else ''))
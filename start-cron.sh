@@ -4,6 +4,22 @@ set -eu
 : "${CRON_SCHEDULE:=*/30 * * * *}"
 : "${CRON_LOG_MODE:=file}"
 : "${CRON_LOG_FILE:=/var/log/metrics-cron.log}"
+: "${SCHEDULER_MODE:=cron}"
+
+if [ "$SCHEDULER_MODE" = "daemon" ]; then
+  # One long-running process schedules the runs itself (see daemon.py)
+  echo "[metrics-generator] daemon schedule: ${CRON_SCHEDULE}"
+  export CRON_SCHEDULE
+  cd /app
+  if [ "$CRON_LOG_MODE" = "file" ]; then
+    echo "[metrics-generator] log file: ${CRON_LOG_FILE}"
+    exec uv run daemon.py >> "$CRON_LOG_FILE" 2>&1
+  fi
+  exec uv run daemon.py
+elif [ "$SCHEDULER_MODE" != "cron" ]; then
+  echo "[metrics-generator] invalid SCHEDULER_MODE: ${SCHEDULER_MODE}. Use 'cron' or 'daemon'."
+  exit 1
+fi
 
 CRON_FILE="/etc/cron.d/metrics-generator"
 CRON_COMMAND="cd /app && ./run.sh >> ${CRON_LOG_FILE} 2>&1"
@@ -24,7 +40,7 @@ esac
   echo "SHELL=/bin/sh"
   echo "PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
 
-  for var in ACCESS_TOKEN TARGET_REPOSITORY USER_NAME PROXY EXCLUDED_REPOS LASTFM_TOKEN LASTFM_USER EXCLUDED_LANGUAGES GIT_USER_NAME GIT_USER_EMAIL TARGET_BRANCH SVG_HEADER_IDENTITY; do
+  for var in ACCESS_TOKEN TARGET_REPOSITORY USER_NAME PROXY EXCLUDED_REPOS LASTFM_TOKEN LASTFM_USER EXCLUDED_LANGUAGES GIT_USER_NAME GIT_USER_EMAIL TARGET_BRANCH SVG_HEADER_IDENTITY GITHUB_API_CONCURRENCY LOC_REFRESH_CONCURRENCY LOC_BATCH_SIZE LOC_BATCH_COMMITS LOC_CHECKPOINT_PAGES LANGUAGE_BATCH_SIZE GITHUB_API_MAX_CONCURRENCY METRICS_TTL METRICS_DATA_DIR PUBLISH_MODE LIFETIME_CONTRIBUTIONS; do
     val="$(printenv "$var" || true)"
     if [ -n "$val" ]; then
       escaped="$(printf '%s' "$val" | sed "s/'/'\"'\"'/g")"
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+
+def cache_filename(user_name, extension='json'):
+    """
+    Returns the per-user cache path, e.g. cache/<sha256(user)>.json
+    The legacy positional text cache lives next to it with the .txt extension
+    """
+    return 'cache/' + hashlib.sha256(user_name.encode('utf-8')).hexdigest() + '.' + extension
+
+
+LOADED = None # {path: ((mtime_ns, size), data)} of the files written by the last run, while keep_loaded is on
+
+
+def keep_loaded():
+    """
+    Keeps every JSON file written from now on in memory, so the next run in this process (the daemon) doesn't parse it again
+    A file that changed on disk since it was written (e.g. by a pull) is read from disk
+    """
+    global LOADED
+    if LOADED is None:
+        LOADED = {}
+
+
+def forget_loaded():
+    """
+    Drops the files kept in memory, e.g. after a failed run whose objects may be ahead of what it saved
+    """
+    if LOADED is not None:
+        LOADED.clear()
+
+
+def file_key(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_json(filename, default=None):
+    """
+    Returns the decoded content of a JSON file, or default if the file doesn't exist
+    A kept file is handed over to the caller (and dropped from memory), so it is only reused once it is written back
+    """
+    if LOADED is not None and os.path.abspath(filename) in LOADED:
+        key, data = LOADED.pop(os.path.abspath(filename))
+        try:
+            if file_key(filename) == key:
+                return data
+        except FileNotFoundError:
+            return default
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(filename, data):
+    """
+    Writes a JSON file atomically (temp file + rename), so a crash never leaves a half-written file
+    """
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(temp_filename, filename)
+    if LOADED is not None:
+        LOADED[os.path.abspath(filename)] = (file_key(filename), data)
@@ -0,0 +1,80 @@
+from lxml import etree
+from loguru import logger
+
+from svg_header import make_header_tail
+
+THEME_FILLS = {'dark': '#c9d1d9', 'light': '#24292f'} # text color of each theme
+THEME_COLORS = {'dark': {'#24292f': '#c9d1d9'}, 'light': {'#c9d1d9': '#24292f'}} # fills swapped to match the theme
+HEADER_X = '390' # section headers ('- GitHub Stats', ...) are the tspans of the text elements in this column
+IDENTITY_Y = '30'
+
+
+def local_name(element):
+    return etree.QName(element).localname
+
+
+class SvgTemplate:
+    """
+    One theme file (dark_mode.svg or light_mode.svg), parsed once with its elements indexed by id in a single traversal
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.theme = 'dark' if 'dark' in filename else 'light' if 'light' in filename else None
+        self.tree = etree.parse(filename)
+        self.root = self.tree.getroot()
+        self.by_id = {}
+        self.identity = None # first tspan of the top header, which holds the account name
+        for element in self.root.iter(etree.Element):
+            element_id = element.get('id')
+            if element_id is not None:
+                self.by_id.setdefault(element_id, element)
+            if self.identity is None and local_name(element) == 'text' and element.get('x') == HEADER_X and element.get('y') == IDENTITY_Y:
+                self.identity = next((child for child in element if local_name(child) == 'tspan'), None)
+
+    @property
+    def data_filename(self):
+        """
+        The art file the ascii block was last written with
+        """
+        ascii_block = self.by_id.get('ascii')
+        if ascii_block is not None and ascii_block.get('data-filename'):
+            return ascii_block.get('data-filename')
+        return self.root.get('data-filename')
+
+    def replace_block(self, element_id, svg_block):
+        old = self.by_id.get(element_id)
+        if old is None:
+            logger.warning('SVG element with id={name} not found', name=element_id)
+            return
+        new = etree.fromstring(svg_block)
+        if self.theme:
+            new.attrib['fill'] = THEME_FILLS[self.theme]
+        old.getparent().replace(old, new)
+        self.by_id[element_id] = new
+
+    def apply(self, blocks, identity):
+        """
+        Replaces the blocks ({id: svg}) and the identity header, then fixes header tails and theme colors in one pass
+        """
+        if self.identity is not None:
+            self.identity.text = identity
+        else:
+            logger.warning('Top identity header not found in {filename}', filename=self.filename)
+        for element_id, svg_block in blocks.items():
+            self.replace_block(element_id, svg_block)
+
+        colors = THEME_COLORS.get(self.theme, {})
+        for element in self.root.iter(etree.Element):
+            fill = element.get('fill')
+            if fill in colors:
+                element.attrib['fill'] = colors[fill]
+            if local_name(element) != 'tspan':
+                continue
+            title = (element.text or '').strip()
+            parent = element.getparent()
+            if element is self.identity or (title.startswith('- ') and local_name(parent) == 'text' and parent.get('x') == HEADER_X):
+                element.tail = make_header_tail(title)
+
+    def write(self):
+        self.tree.write(self.filename, encoding='utf-8', xml_declaration=True)
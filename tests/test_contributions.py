@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import os
+import tempfile
+import unittest
+
+import today
+from contributions import calendar_days, calendar_start, current_streak, merge_calendar, window_total, years_to_query
+
+
+class TestContributions(unittest.TestCase):
+    def test_calendar_is_flattened_by_date(self):
+        calendar = {"weeks": [
+            {"contributionDays": [{"date": "2024-01-06", "contributionCount": 1}]},
+            {"contributionDays": [{"date": "2024-01-07", "contributionCount": 0}, {"date": "2024-01-08", "contributionCount": 4}]},
+        ]}
+        self.assertEqual(calendar_days(calendar), {"2024-01-06": 1, "2024-01-07": 0, "2024-01-08": 4})
+
+    def test_streak_ignores_an_empty_today(self):
+        days = {"2024-01-05": 2, "2024-01-06": 0, "2024-01-07": 3, "2024-01-08": 1, "2024-01-09": 0}
+        self.assertEqual(current_streak(days, datetime.date(2024, 1, 9)), 2)
+        self.assertEqual(current_streak(dict(days, **{"2024-01-09": 5}), datetime.date(2024, 1, 9)), 3)
+
+    def test_streak_skips_days_after_today(self):
+        days = {"2024-01-08": 1, "2024-01-09": 1, "2024-01-10": 0}
+        self.assertEqual(current_streak(days, datetime.date(2024, 1, 9)), 2)
+
+
+class TestCachedCalendar(unittest.TestCase):
+    def test_only_the_trailing_days_are_queried_again(self):
+        today = datetime.date(2024, 3, 10)
+        self.assertEqual(calendar_start({}, today), datetime.date(2023, 3, 11))
+        self.assertEqual(calendar_start({"2024-03-01": 1, "2024-03-09": 0}, today), datetime.date(2024, 3, 7))
+        self.assertEqual(calendar_start({"2022-01-01": 1}, today), datetime.date(2023, 3, 11))
+
+    def test_merge_replaces_fresh_days_and_drops_days_out_of_the_window(self):
+        today = datetime.date(2024, 3, 10)
+        days = {"2023-03-10": 9, "2024-03-08": 1, "2024-03-09": 0}
+        merged = merge_calendar(days, {"2024-03-09": 2, "2024-03-10": 3}, today)
+
+        self.assertEqual(merged, {"2024-03-08": 1, "2024-03-09": 2, "2024-03-10": 3})
+        self.assertEqual(window_total(merged, today, 2), 5)
+        self.assertEqual(window_total(merged, today, 7), 6)
+
+    def test_closed_years_are_queried_once(self):
+        self.assertEqual(years_to_query({}, 2021, datetime.date(2024, 1, 2)), [2021, 2022, 2023, 2024])
+        self.assertEqual(years_to_query({"2021": 5, "2022": 7, "2023": 1}, 2021, datetime.date(2024, 1, 2)), [2023, 2024])
+        self.assertEqual(years_to_query({"2021": 5, "2022": 7, "2023": 1}, 2021, datetime.date(2024, 1, 3)), [2024])
+
+
+class PartialProfile:
+    """
+    Answers the profile query with the given user fields, as GitHub does when some of them failed
+    """
+
+    def __init__(self, user, errors=None):
+        self.user = user
+        self.errors = errors
+
+    async def graphql(self, query, variables):
+        body = {"data": {"user": self.user}}
+        if self.errors:
+            body["errors"] = self.errors
+        return 200, body
+
+
+class TestProfileGetter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def profile(self, user, errors=None, previous_followers=None):
+        return asyncio.run(today.profile_getter(PartialProfile(user, errors), "me", previous_followers))
+
+    def test_missing_fields_fall_back_instead_of_failing(self):
+        profile = self.profile({"id": "ME", "createdAt": "2020-01-01T00:00:00Z", "followers": None, "contributionsCollection": None},
+                               [{"message": "timeout", "path": ["user", "contributionsCollection"]}], previous_followers=12)
+
+        self.assertEqual((profile["id"], profile["followers"], profile["recent_commits"], profile["streak"]), ("ME", 12, 0, 0))
+
+    def test_missing_followers_without_a_stored_count_fails(self):
+        with self.assertRaises(Exception):
+            self.profile({"id": "ME", "createdAt": "2020-01-01T00:00:00Z", "followers": None, "contributionsCollection": None},
+                         [{"message": "timeout", "path": ["user", "followers"]}])
+
+    def test_missing_calendar_keeps_the_cached_one(self):
+        date = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        calendar = {"weeks": [{"contributionDays": [{"date": date, "contributionCount": 4}]}]}
+        self.profile({"id": "ME", "createdAt": "2020-01-01T00:00:00Z", "followers": {"totalCount": 3}, "contributionsCollection": {"contributionCalendar": calendar}})
+
+        profile = self.profile({"id": "ME", "createdAt": "2020-01-01T00:00:00Z", "followers": {"totalCount": 3}, "contributionsCollection": None})
+
+        self.assertEqual((profile["followers"], profile["recent_commits"], profile["streak"]), (3, 4, 1))
+
+    def test_missing_user_fails(self):
+        with self.assertRaises(Exception):
+            self.profile(None, [{"message": "Could not resolve to a User"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
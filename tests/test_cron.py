@@ -0,0 +1,35 @@
+import datetime
+import unittest
+
+from cron import CronSchedule, parse_field
+
+
+class TestCron(unittest.TestCase):
+    def test_fields(self):
+        self.assertEqual(parse_field("*/15", 0, 59), {0, 15, 30, 45})
+        self.assertEqual(parse_field("1-5,10", 0, 23), {1, 2, 3, 4, 5, 10})
+        self.assertEqual(parse_field("5/20", 0, 59), {5, 25, 45})
+        with self.assertRaises(ValueError):
+            parse_field("60", 0, 59)
+
+    def test_next_run_every_30_minutes(self):
+        schedule = CronSchedule("*/30 * * * *")
+        self.assertEqual(schedule.next_after(datetime.datetime(2024, 1, 1, 10, 0, 5)), datetime.datetime(2024, 1, 1, 10, 30))
+        self.assertEqual(schedule.next_after(datetime.datetime(2024, 1, 1, 23, 45)), datetime.datetime(2024, 1, 2, 0, 0))
+
+    def test_next_run_crosses_months_and_matches_day_or_weekday(self):
+        self.assertEqual(CronSchedule("0 9 1 * *").next_after(datetime.datetime(2024, 1, 31, 12, 0)), datetime.datetime(2024, 2, 1, 9, 0))
+        # the 15th, or any Sunday (7 is Sunday as well)
+        schedule = CronSchedule("0 0 15 * 7")
+        self.assertEqual(schedule.next_after(datetime.datetime(2024, 3, 1)), datetime.datetime(2024, 3, 3))
+        self.assertEqual(schedule.next_after(datetime.datetime(2024, 3, 10)), datetime.datetime(2024, 3, 15))
+
+    def test_impossible_expression_is_rejected(self):
+        with self.assertRaises(ValueError):
+            CronSchedule("0 0 30 2 *").next_after(datetime.datetime(2024, 1, 1))
+        with self.assertRaises(ValueError):
+            CronSchedule("* * *")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from fingerprint import directory_digests, fingerprint, load_fingerprints, record_file, save_fingerprints, stale_blocks
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.svg = os.path.join(self.tmp.name, "dark_mode.svg")
+        self.filename = os.path.join(self.tmp.name, "cache", "user.fingerprints.json")
+        with open(self.svg, "w") as f:
+            f.write("<svg/>")
+
+    def test_fingerprint_does_not_depend_on_key_order(self):
+        self.assertEqual(fingerprint({"a": 1, "b": [1, 2]}), fingerprint({"b": [1, 2], "a": 1}))
+        self.assertNotEqual(fingerprint({"a": 1}), fingerprint({"a": 2}))
+
+    def test_only_blocks_with_new_inputs_are_stale(self):
+        blocks = {"github_stats": fingerprint(1), "languages_block": fingerprint(["Python"])}
+        fingerprints = load_fingerprints(self.filename)
+        self.assertEqual(stale_blocks(fingerprints, self.svg, blocks), {"github_stats", "languages_block"})
+
+        record_file(fingerprints, self.svg, blocks)
+        save_fingerprints(self.filename, fingerprints)
+        fingerprints = load_fingerprints(self.filename)
+
+        self.assertEqual(stale_blocks(fingerprints, self.svg, blocks), set())
+        self.assertEqual(stale_blocks(fingerprints, self.svg, dict(blocks, github_stats=fingerprint(2))), {"github_stats"})
+
+    def test_every_block_is_stale_when_the_file_changed(self):
+        blocks = {"github_stats": fingerprint(1), "languages_block": fingerprint(["Python"])}
+        fingerprints = load_fingerprints(self.filename)
+        record_file(fingerprints, self.svg, blocks)
+        with open(self.svg, "w") as f:
+            f.write("<svg><text/></svg>")
+
+        self.assertEqual(stale_blocks(fingerprints, self.svg, blocks), {"github_stats", "languages_block"})
+
+
+    def test_directory_digests_skip_temp_files(self):
+        cache = os.path.dirname(self.filename)
+        os.makedirs(os.path.join(cache, "http"))
+        for name, data in (("user.json", "{}"), ("user.json.tmp", "{"), ("http/page.json", "[]")):
+            with open(os.path.join(cache, name), "w") as f:
+                f.write(data)
+
+        digests = directory_digests(cache)
+
+        self.assertEqual(sorted(os.path.relpath(path, cache) for path in digests), [os.path.join("http", "page.json"), "user.json"])
+        with open(os.path.join(cache, "user.json"), "w") as f:
+            f.write('{"a": 1}')
+        self.assertNotEqual(directory_digests(cache), digests)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from freshness import load_state, parse_ttls, refresh, save_state
+from storage import write_json
+
+
+class TestFreshness(unittest.TestCase):
+    def test_ttls_default_to_refreshing_every_run(self):
+        self.assertEqual(parse_ttls(None), {"profile": 0, "repositories": 0, "lastfm": 0, "ascii": 0})
+        self.assertEqual(parse_ttls(" repositories=3600, lastfm=60 ")["repositories"], 3600)
+        with self.assertRaises(ValueError):
+            parse_ttls("loc=60")
+
+    def test_stored_value_is_reused_until_the_ttl_expires(self):
+        state = {}
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(asyncio.run(refresh(state, "lastfm", 300, fetch, now=1000)), (1, True))
+        self.assertEqual(asyncio.run(refresh(state, "lastfm", 300, fetch, now=1299)), (1, False))
+        self.assertEqual(asyncio.run(refresh(state, "lastfm", 300, fetch, now=1300)), (2, True))
+        self.assertEqual(state["lastfm"], {"fetched_at": 1300, "value": 2})
+
+    def test_metric_without_ttl_is_stored_without_its_fetch_time(self):
+        state = {}
+
+        self.assertEqual(asyncio.run(refresh(state, "ascii", 0, lambda: asyncio.sleep(0, "arts/a.txt"), now=1000)), ("arts/a.txt", True))
+        self.assertEqual(asyncio.run(refresh(state, "ascii", 0, lambda: asyncio.sleep(0, "arts/a.txt"), now=2000)), ("arts/a.txt", True))
+        self.assertEqual(state["ascii"], {"fetched_at": 0, "value": "arts/a.txt"})
+
+    def test_state_saved_by_another_version_is_dropped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "user.metrics.json")
+            write_json(filename, {"lastfm": {"fetched_at": 1000, "value": "<text/>"}})
+            state = load_state(filename)
+            self.assertNotIn("lastfm", state)
+
+            asyncio.run(refresh(state, "lastfm", 300, lambda: asyncio.sleep(0, "tracks"), now=1000))
+            save_state(filename, state)
+            self.assertEqual(load_state(filename)["lastfm"]["value"], "tracks")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from github_api import GitHubClient, RateLimiter, paginate
+
+
+def fake_request(pages, calls):
+    async def request(query, variables):
+        calls.append(variables)
+        index = int(variables["cursor"] or 0)
+        return {"data": {"user": {"repositories": {
+            "edges": [{"node": name} for name in pages[index]],
+            "pageInfo": {"endCursor": str(index + 1), "hasNextPage": index + 1 < len(pages)},
+        }}}}
+    return request
+
+
+async def collect(generator):
+    return [item async for item in generator]
+
+
+async def collect_nodes(generator):
+    return [edge["node"] async for page in generator for edge in page["edges"]]
+
+
+class TestPaginate(unittest.TestCase):
+    def test_yields_every_page_without_sharing_state_between_calls(self):
+        calls = []
+        request = fake_request([["a", "b"], ["c"], ["d"]], calls)
+        path = ("data", "user", "repositories")
+
+        first = asyncio.run(collect_nodes(paginate(request, "query", {"login": "me"}, path)))
+        second = asyncio.run(collect_nodes(paginate(request, "query", {"login": "me"}, path)))
+
+        self.assertEqual(first, ["a", "b", "c", "d"])
+        self.assertEqual(second, first)
+        self.assertEqual([c["cursor"] for c in calls], [None, "1", "2", None, "1", "2"])
+        self.assertTrue(all(c["login"] == "me" for c in calls))
+
+    def test_resumes_from_cursor(self):
+        calls = []
+        request = fake_request([["a"], ["b"], ["c"]], calls)
+        pages = asyncio.run(collect(paginate(request, "query", {}, ("data", "user", "repositories"), cursor="1")))
+        self.assertEqual([p["edges"][0]["node"] for p in pages], ["b", "c"])
+
+    def test_stops_on_null_connection(self):
+        async def request(query, variables):
+            return {"data": {"repository": {"defaultBranchRef": None}}}
+
+        pages = asyncio.run(collect(paginate(request, "query", {}, ("data", "repository", "defaultBranchRef", "target", "history"))))
+        self.assertEqual(pages, [])
+
+    def test_deep_pagination_does_not_recurse(self):
+        calls = []
+        request = fake_request([[str(i)] for i in range(3000)], calls)
+        nodes = asyncio.run(collect_nodes(paginate(request, "query", {}, ("data", "user", "repositories"))))
+        self.assertEqual(len(nodes), 3000)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(4, 8, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_concurrency_grows_slowly_and_halves_on_rate_limit(self):
+        for _ in range(4):
+            self.assertFalse(self.limiter.update(200, {}))
+        self.assertEqual(int(self.limiter.concurrency), 4)
+        self.assertGreater(self.limiter.concurrency, 4.9)
+
+        self.assertTrue(self.limiter.update(403, {"Retry-After": "30"}))
+        self.assertEqual(int(self.limiter.concurrency), 2)
+        self.assertEqual(self.limiter.paused_until, 1030.0)
+
+    def test_exhausted_budget_pauses_until_reset(self):
+        self.limiter.update(200, {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1600"})
+
+        async def run():
+            async with self.limiter:
+                pass
+        asyncio.run(run())
+
+        self.assertEqual(self.clock.sleeps, [600.0])
+
+    def test_graphql_rate_limited_error_reads_the_rate_limit_block(self):
+        body = {"data": {"rateLimit": {"cost": 1, "limit": 5000, "remaining": 0, "resetAt": "1970-01-01T00:20:00Z"}}, "errors": [{"type": "RATE_LIMITED"}]}
+        self.assertTrue(self.limiter.update(200, {}, body))
+        self.assertEqual(self.limiter.paused_until, 1200.0)
+
+    def test_low_budget_spreads_requests_until_reset(self):
+        self.limiter.update(200, {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "1100"})
+
+        async def run():
+            for _ in range(2):
+                async with self.limiter:
+                    pass
+        asyncio.run(run())
+
+        self.assertEqual(self.clock.sleeps, [10.0])
+
+
+class TestGitHubClient(unittest.IsolatedAsyncioTestCase):
+    async def test_graphql_waits_out_a_rate_limit_and_sends_the_token(self):
+        requests = []
+
+        async def graphql(request):
+            requests.append((request.headers.get("Authorization"), await request.json()))
+            if len(requests) == 1:
+                return web.Response(status=403, headers={"Retry-After": "0"})
+            return web.json_response({"data": {"viewer": {"login": "me"}}}, headers={"X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "0"})
+
+        app = web.Application()
+        app.router.add_post("/graphql", graphql)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+
+        async with GitHubClient("secret", api_url=str(server.make_url("/"))) as client:
+            status, body = await client.graphql("query { viewer { login } }", {})
+
+        self.assertEqual((status, body), (200, {"data": {"viewer": {"login": "me"}}}))
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[1], ("token secret", {"query": "query { viewer { login } }", "variables": {}}))
+        self.assertEqual(client.limiter.remaining, 4999)
+
+
+if __name__ == "__main__":
+    unittest.main()
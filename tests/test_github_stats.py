@@ -67,6 +67,33 @@ class TestGithubStatsFormatting(unittest.TestCase):
         self.assertLessEqual(len(loc_add_val), 9)
         self.assertLessEqual(len(loc_del_val), 9)
 
+    def test_lifetime_contributions_row_is_optional_and_aligned(self):
+        stats = dict(
+            x=390,
+            y=390,
+            fill_color="#c9d1d9",
+            commit_data=1643,
+            star_data=245,
+            repo_data=1011,
+            contrib_data=115,
+            follower_data=1421,
+            loc_total=3_500_000,
+            loc_add=5_600_000,
+            loc_del=2_138_000,
+            recent_commit_data=22,
+            streak_data=10,
+        )
+        self.assertNotIn("lifetime_contrib_data", generate_github_stats_svg(**stats))
+
+        svg = generate_github_stats_svg(**stats, lifetime_contrib_data=12_345)
+        lines = [re.sub(r"<[^>]+>", "", line) for line in svg.split("\n")]
+        commits_line = next(line for line in lines if "Commits:" in line)
+        lifetime_line = next(line for line in lines if "Contributions (all time)" in line)
+
+        self.assertEqual(self.extract_cc_segment(svg, "lifetime_contrib_data"), "12,345")
+        self.assertEqual(len(lifetime_line), len(commits_line))
+        self.assertIn('y="490"', next(line for line in svg.split("\n") if "Lines of Code" in line))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from github_api import GitHubClient
+from http_cache import cache_path, get_json
+
+
+class TestHttpCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.requests = []
+
+        async def handler(request):
+            self.requests.append(dict(request.headers))
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.json_response({"count": len(self.requests)}, headers={"ETag": '"v1"'})
+
+        async def failing(request):
+            return web.Response(status=500, text="boom")
+
+        app = web.Application()
+        app.router.add_get("/data", handler)
+        app.router.add_get("/fail", failing)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.client = await GitHubClient("token").__aenter__()
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.server.close()
+
+    async def test_not_modified_is_served_from_the_stored_body(self):
+        url = str(self.server.make_url("/data?api_key=secret"))
+
+        first = await get_json(self.client, url, cache_dir=self.tmp.name)
+        second = await get_json(self.client, url, cache_dir=self.tmp.name)
+
+        self.assertEqual(first, {"count": 1})
+        self.assertEqual(second, {"count": 1})
+        self.assertEqual(self.requests[1]["If-None-Match"], '"v1"')
+        self.assertTrue(os.path.exists(cache_path(url, self.tmp.name)))
+        self.assertNotIn("secret", os.listdir(self.tmp.name)[0])
+        self.assertNotIn("Authorization", self.requests[0])
+
+    async def test_errors_are_raised(self):
+        with self.assertRaises(Exception):
+            await get_json(self.client, str(self.server.make_url("/fail")), cache_dir=self.tmp.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
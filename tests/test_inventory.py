@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+import today
+
+# (nameWithOwner, affiliation, stars): the affiliation is how GitHub would list the repository for "me"
+REPOSITORIES = [(f"me/own{i}", "OWNER", i % 7) for i in range(130)] + [
+    ("Me/CasedOwner", "OWNER", 5),
+    ("friend/shared", "COLLABORATOR", 40),
+    ("org/tool", "ORGANIZATION_MEMBER", 900),
+    ("org/other", "ORGANIZATION_MEMBER", 3),
+]
+
+
+class FakeGitHub:
+    """
+    Serves the repository listing of the inventory query, 100 repositories a page, filtered by ownerAffiliations
+    """
+
+    def __init__(self, repositories):
+        self.repositories = repositories
+
+    def listing(self, affiliations):
+        return [repo for repo in self.repositories if repo[1] in affiliations]
+
+    async def graphql(self, query, variables):
+        listed = self.listing(variables["owner_affiliation"])
+        start = int(variables.get("cursor") or 0)
+        page = listed[start:start + 100]
+        edges = [{"node": {
+            "id": "ID" + name,
+            "nameWithOwner": name,
+            "owner": {"login": name.split("/")[0]},
+            "stargazerCount": stars,
+            "pushedAt": "2024-01-01T00:00:00Z",
+            "defaultBranchRef": {"target": {"oid": "head"}},
+        }} for name, _, stars in page]
+        return 200, {"data": {"user": {"repositories": {
+            "totalCount": len(listed),
+            "edges": edges,
+            "pageInfo": {"endCursor": str(start + len(page)), "hasNextPage": start + 100 < len(listed)},
+        }}}}
+
+
+def old_counts(client):
+    """
+    The counts of the per-affiliation queries the inventory replaced (graph_repos_stars)
+    """
+    owned = client.listing(["OWNER"])
+    return {
+        "repos": len(owned),
+        "stars": sum(stars for _, _, stars in owned),
+        "contributed": len(client.listing(today.OWNER_AFFILIATIONS)),
+    }
+
+
+class TestRepositoryCounts(unittest.TestCase):
+    def setUp(self):
+        self.configure(USER_NAME="me", EXCLUDED_REPOS=[])
+
+    def configure(self, **values):
+        for name, value in values.items():
+            self.addCleanup(setattr, today, name, getattr(today, name))
+            setattr(today, name, value)
+
+    def counts(self, client):
+        edges = asyncio.run(today.inventory_query(client, today.OWNER_AFFILIATIONS))
+        return today.repository_counts(edges)
+
+    def test_inventory_counts_match_the_per_affiliation_queries(self):
+        client = FakeGitHub(REPOSITORIES)
+
+        counts = self.counts(client)
+
+        self.assertEqual(counts, old_counts(client))
+        self.assertEqual(counts, {"repos": 131, "stars": sum(i % 7 for i in range(130)) + 5, "contributed": 134})
+
+    def test_excluded_repos_do_not_change_the_counts(self):
+        client = FakeGitHub(REPOSITORIES)
+        self.configure(EXCLUDED_REPOS=["me/own1", "me/own6", "org/tool"])
+
+        self.assertEqual(self.counts(client), old_counts(client))
+
+
+if __name__ == "__main__":
+    unittest.main()
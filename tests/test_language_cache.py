@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from language_cache import build_languages_batch_query, load_language_cache, save_language_cache, sync_repos
+
+
+def node(node_id, name, pushed_at):
+    return {"id": node_id, "nameWithOwner": name, "pushedAt": pushed_at}
+
+
+class TestLanguageCache(unittest.TestCase):
+    def test_only_pushed_or_new_repositories_are_stale(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        filename = os.path.join(tmp.name, "cache", "user.languages.json")
+
+        cache = load_language_cache(filename)
+        cache["repos"] = {
+            "A": {"name": "me/a", "pushed_at": "t1", "languages": {"Python": {"size": 10, "color": None}}},
+            "B": {"name": "me/b", "pushed_at": "t1", "languages": {}},
+            "GONE": {"name": "me/gone", "pushed_at": "t1", "languages": {}},
+        }
+        save_language_cache(filename, cache)
+
+        cache = load_language_cache(filename)
+        stale = sync_repos(cache, [node("A", "me/renamed", "t1"), node("B", "me/b", "t2"), node("C", "me/c", None)])
+
+        self.assertEqual([n["id"] for n in stale], ["B", "C"])
+        self.assertEqual(sorted(cache["repos"]), ["A", "B"])
+        self.assertEqual(cache["repos"]["A"]["name"], "me/renamed")
+
+    def test_query_uses_one_alias_per_repository(self):
+        query, variables = build_languages_batch_query([node("A", "me/a", None), node("B", "org/b", None)])
+
+        self.assertIn("r0: repository(owner: $owner0, name: $name0)", query)
+        self.assertIn("r1: repository(owner: $owner1, name: $name1)", query)
+        self.assertIn("languages(first: 10, orderBy: {field: SIZE, direction: DESC})", query)
+        self.assertEqual(variables, {"owner0": "me", "name0": "a", "owner1": "org", "name1": "b"})
+
+
+if __name__ == "__main__":
+    unittest.main()
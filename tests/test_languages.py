@@ -0,0 +1,29 @@
+import unittest
+
+from languages_svg import get_most_used_languages, repository_languages
+
+
+def languages(*edges):
+    return {"edges": [{"size": size, "node": {"name": name, "color": color}} for name, size, color in edges]}
+
+
+class TestMostUsedLanguages(unittest.TestCase):
+    def test_sizes_are_summed_across_repositories(self):
+        repos = [
+            repository_languages(languages(("Python", 300, "#3572A5"), ("Shell", 100, "#89e051"))),
+            repository_languages(languages(("Python", 100, "#3572A5"), ("HTML", 400, "#e34c26"))),
+        ]
+        result = get_most_used_languages(repos, excluded_languages=["html"])
+
+        self.assertEqual([(lang["name"], lang["bytes_count"]) for lang in result], [("Python", 400), ("Shell", 100)])
+        self.assertEqual(result[0]["percentage"], 80.0)
+
+    def test_github_color_wins_over_the_builtin_map(self):
+        repos = [repository_languages(languages(("Python", 10, "#123456"), ("Text", 5, None)))]
+        result = get_most_used_languages(repos)
+
+        self.assertEqual([lang["color"] for lang in result], ["#123456", "#cccccc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
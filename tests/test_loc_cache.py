@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+from loc_cache import LocAggregate, load_loc_cache, repo_hash, save_loc_cache, sync_repos
+
+
+def edge(node_id, name):
+    return {"node": {"id": node_id, "nameWithOwner": name}}
+
+
+class TestLocCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.filename = os.path.join(self.tmp.name, "cache", "user.json")
+        self.legacy_filename = os.path.join(self.tmp.name, "user.txt")
+
+    def write_legacy(self, rows):
+        comment = [f"comment line {i}\n" for i in range(7)]
+        with open(self.legacy_filename, "w") as f:
+            f.writelines(comment)
+            f.writelines(rows)
+        return comment
+
+    def test_migrates_legacy_text_cache_and_keeps_comment_block(self):
+        comment = self.write_legacy([
+            f"{repo_hash('me/a')} 10 4 100 20 abc123\n",
+            f"{repo_hash('me/b')} 3 1 7 2\n",
+        ])
+
+        cache = load_loc_cache(self.filename, self.legacy_filename, 7)
+        entries, added = sync_repos(cache, [edge("B", "me/b"), edge("A", "me/a")])
+
+        self.assertEqual(cache["comment"], comment)
+        self.assertEqual(added, 0)
+        self.assertEqual([e["name"] for e in entries], ["me/b", "me/a"])
+        self.assertEqual(cache["repos"]["A"]["head_oid"], "abc123")
+        self.assertEqual(cache["repos"]["B"]["additions"], 7)
+        self.assertIsNone(cache["repos"]["B"]["head_oid"])
+
+    def test_new_renamed_and_removed_repos_only_touch_their_own_rows(self):
+        cache = load_loc_cache(self.filename)
+        entries, _ = sync_repos(cache, [edge("A", "me/a"), edge("B", "me/b")])
+        entries[0].update(branch_oid="a5", additions=50)
+        entries[1].update(branch_oid="b2", additions=9)
+        save_loc_cache(self.filename, cache)
+
+        cache = load_loc_cache(self.filename)
+        entries, added = sync_repos(cache, [edge("C", "me/c"), edge("A", "me/renamed")])
+
+        self.assertEqual(added, 1)
+        self.assertEqual(entries[1], {"name": "me/renamed", "branch_oid": "a5", "my_commits": 0, "additions": 50, "deletions": 0, "head_oid": None})
+        self.assertEqual(entries[0]["additions"], 0)
+        self.assertNotIn("B", cache["repos"])
+
+    def test_save_does_not_leave_temp_file(self):
+        cache = load_loc_cache(self.filename, comment_size=7)
+        save_loc_cache(self.filename, cache)
+
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ["user.json"])
+        self.assertEqual(len(load_loc_cache(self.filename)["comment"]), 7)
+
+
+class TestLocAggregate(unittest.TestCase):
+    def test_totals_sum_every_row(self):
+        rows = [
+            {"additions": 100, "deletions": 20, "my_commits": 7},
+            {"additions": 0, "deletions": 0, "my_commits": 0},
+            {"additions": 35, "deletions": 40, "my_commits": 3},
+        ]
+
+        totals = LocAggregate(rows, 2)
+
+        self.assertEqual((totals.additions, totals.deletions, totals.my_commits, totals.cached), (135, 60, 10, 2))
+        self.assertEqual(totals.net, 75)
+
+    def test_no_rows(self):
+        totals = LocAggregate([], 0)
+
+        self.assertEqual((totals.additions, totals.deletions, totals.my_commits, totals.net), (0, 0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
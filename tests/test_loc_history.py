@@ -0,0 +1,82 @@
+import unittest
+
+from loc_history import RepoCrawl, build_history_batch_query, expected_page_size, failed_aliases, plan_batches
+
+
+def commit(oid, additions=10, deletions=1):
+    return {"node": {"oid": oid, "additions": additions, "deletions": deletions}}
+
+
+def history(*commits, end_cursor="c1", has_next_page=False):
+    return {"edges": list(commits), "pageInfo": {"endCursor": end_cursor, "hasNextPage": has_next_page}}
+
+
+class TestRepoCrawl(unittest.TestCase):
+    def test_stops_at_last_counted_commit(self):
+        crawl = RepoCrawl("me/repo", last_oid="old")
+        crawl.apply_page(history(commit("new2"), commit("new1", additions=5), commit("old"), commit("older"), has_next_page=True))
+
+        self.assertTrue(crawl.done)
+        self.assertTrue(crawl.reached_last_oid)
+        self.assertEqual((crawl.my_commits, crawl.additions, crawl.deletions), (2, 15, 2))
+        self.assertEqual(crawl.head_oid, "new2")
+
+    def test_walks_whole_history_when_last_commit_was_rewritten(self):
+        crawl = RepoCrawl("me/repo", last_oid="gone", page_size=2)
+        crawl.apply_page(history(commit("b"), commit("a"), has_next_page=True))
+
+        self.assertFalse(crawl.done)
+        self.assertEqual(crawl.cursor, "c1")
+        self.assertEqual(crawl.page_size, 100)
+
+        crawl.apply_page(history(commit("root")))
+        self.assertTrue(crawl.done)
+        self.assertFalse(crawl.reached_last_oid)
+        self.assertEqual(crawl.my_commits, 3)
+        self.assertEqual(crawl.head_oid, "b")
+
+    def test_missing_default_branch_marks_repository_empty(self):
+        crawl = RepoCrawl("me/repo")
+        crawl.apply_page(None)
+        self.assertTrue(crawl.empty)
+        self.assertTrue(crawl.done)
+
+
+class TestHistoryBatches(unittest.TestCase):
+    def test_incremental_crawls_start_with_a_small_page(self):
+        self.assertEqual(expected_page_size(incremental=True), 10)
+        self.assertEqual(expected_page_size(incremental=False), 100)
+
+    def test_batches_respect_repository_and_commit_budgets(self):
+        crawls = [RepoCrawl(f"me/r{i}", page_size=size) for i, size in enumerate([100, 100, 100, 5, 5, 5])]
+        batches = plan_batches(crawls, max_repos=3, max_commits=200)
+        self.assertEqual([[c.name for c in batch] for batch in batches], [["r0", "r1"], ["r2", "r3", "r4"], ["r5"]])
+
+    def test_query_uses_one_alias_per_repository(self):
+        crawls = [RepoCrawl("me/a", page_size=2), RepoCrawl("org/b")]
+        crawls[1].cursor = "abc"
+        query, variables = build_history_batch_query(crawls, "U_me")
+
+        self.assertIn("r0: repository(owner: $owner0, name: $name0)", query)
+        self.assertIn("r1: repository(owner: $owner1, name: $name1)", query)
+        self.assertIn("history(first: 2, after: $cursor0, author: {id: $author_id})", query)
+        self.assertEqual(variables, {"author_id": "U_me", "owner0": "me", "name0": "a", "cursor0": None, "owner1": "org", "name1": "b", "cursor1": "abc"})
+
+    def test_failed_aliases_cover_errors_and_nulled_fields(self):
+        request = {
+            "data": {
+                "r0": {"defaultBranchRef": {"target": {"history": history()}}},
+                "r1": {"defaultBranchRef": {"target": None}},
+                "r2": None,
+                "r3": {"defaultBranchRef": None},
+                "r4": {"defaultBranchRef": {"target": {"history": history()}}},
+                "rateLimit": {"cost": 1},
+            },
+            "errors": [{"message": "Something went wrong", "path": ["r1", "defaultBranchRef", "target", "history"]}, {"message": "timeout", "path": ["r4"]}],
+        }
+
+        self.assertEqual(failed_aliases(request), {"r1", "r2", "r4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
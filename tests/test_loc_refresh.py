@@ -0,0 +1,244 @@
+import asyncio
+import os
+import re
+import tempfile
+import unittest
+
+import loc_cache
+import loc_history
+import storage
+import today
+
+
+class FakeGitHub:
+    """
+    Serves the per-repository and aliased history queries of the LOC stage from {name: [(oid, additions, deletions)]}
+    (newest commit first, every commit is mine), counting how many requests are in flight at once
+    """
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.active = 0
+        self.max_active = 0
+        self.queries = []
+        self.batch_status = 200
+        self.repo_pages_left = None # per-repository pages served before answering 403, None for no limit
+        self.batch_history_errors = set() # repositories whose history fails inside a batch only
+        self.rejected_cursors = set() # cursors GitHub no longer accepts, e.g. after a force-push
+
+    def history(self, name, first, cursor):
+        commits = self.repos[name]
+        start = int(cursor or 0)
+        page = commits[start:start + first]
+        return {
+            "edges": [{"node": {"oid": oid, "additions": additions, "deletions": deletions}} for oid, additions, deletions in page],
+            "pageInfo": {"endCursor": str(start + len(page)), "hasNextPage": start + first < len(commits)},
+        }
+
+    async def graphql(self, query, variables):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.001)
+            if "r0:" in query:
+                self.queries.append(("batch", {variables[f"name{i}"]: variables[f"cursor{i}"] for i in range(len(re.findall(r"r\d+: repository", query)))}))
+                if self.batch_status != 200:
+                    return self.batch_status, "Bad Gateway"
+                data = {}
+                errors = []
+                for index, first in re.findall(r"r(\d+): repository.*?history\(first: (\d+)", query, re.S):
+                    name = variables[f"owner{index}"] + "/" + variables[f"name{index}"]
+                    if name in self.batch_history_errors or variables[f"cursor{index}"] in self.rejected_cursors:
+                        # Commit.history is non-null, so its error nulls the target above it
+                        data["r" + index] = {"defaultBranchRef": {"target": None}}
+                        errors.append({"message": "Something went wrong", "path": ["r" + index, "defaultBranchRef", "target", "history"]})
+                        continue
+                    data["r" + index] = {"defaultBranchRef": {"target": {"history": self.history(name, int(first), variables[f"cursor{index}"])}}}
+                return 200, {"data": data, "errors": errors} if errors else {"data": data}
+            name = variables["owner"] + "/" + variables["repo_name"]
+            self.queries.append(("repo", name, variables["cursor"]))
+            if self.repo_pages_left is not None:
+                if self.repo_pages_left == 0:
+                    return 403, "abuse limit"
+                self.repo_pages_left -= 1
+            if variables["cursor"] in self.rejected_cursors:
+                return 200, {"data": {"repository": {"defaultBranchRef": {"target": None}}},
+                             "errors": [{"message": "Invalid cursor", "path": ["repository", "defaultBranchRef", "target", "history"]}]}
+            return 200, {"data": {"repository": {"defaultBranchRef": {"target": {"history": self.history(name, 100, variables["cursor"])}}}}}
+        finally:
+            self.active -= 1
+
+
+def make_commits(name, count, additions=10, deletions=1):
+    return [(f"{name}-{i}", additions, deletions) for i in range(count, 0, -1)]
+
+
+def edge(name, head_oid):
+    return {"node": {"id": "ID" + name, "nameWithOwner": name, "pushedAt": "2024-01-01T00:00:00Z", "defaultBranchRef": {"target": {"oid": head_oid}}}}
+
+
+class LocStageTestCase(unittest.TestCase):
+    """
+    Runs the LOC stage of today in a temporary directory, with its configuration globals set for the test
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.configure(USER_NAME="me", OWNER_ID={"id": "ME"}, EXCLUDED_REPOS=[], LOC_REFRESH_CONCURRENCY=2,
+                       LOC_BATCH_SIZE=20, LOC_BATCH_COMMITS=500, LOC_CHECKPOINT_PAGES=5)
+
+    def configure(self, **values):
+        for name, value in values.items():
+            self.addCleanup(setattr, today, name, getattr(today, name))
+            setattr(today, name, value)
+
+    def build(self, client, edges):
+        return asyncio.run(today.cache_builder(client, edges, 0, False))
+
+    def saved_rows(self, edges):
+        repos = loc_cache.load_loc_cache(storage.cache_filename("me"))["repos"]
+        return [repos[edge["node"]["id"]] for edge in edges]
+
+
+class TestConcurrentRefresh(LocStageTestCase):
+    def test_refreshed_totals_land_in_their_own_rows_in_inventory_order(self):
+        sizes = {"me/a": 250, "me/b": 3, "me/c": 120, "me/d": 0, "me/e": 310}
+        client = FakeGitHub({name: make_commits(name, count, additions=count) for name, count in sizes.items()})
+        edges = [edge(name, f"{name}-{count}" if count else None) for name, count in sizes.items()]
+
+        totals = self.build(client, edges)
+        rows = self.saved_rows(edges)
+
+        self.assertEqual([row["name"] for row in rows], list(sizes))
+        self.assertEqual([row["my_commits"] for row in rows], list(sizes.values()))
+        self.assertEqual([row["additions"] for row in rows], [count * count for count in sizes.values()])
+        self.assertEqual(totals.my_commits, sum(sizes.values()))
+
+    def test_refresh_concurrency_is_bounded(self):
+        self.configure(LOC_BATCH_SIZE=1)
+        names = [f"me/r{i}" for i in range(8)]
+        client = FakeGitHub({name: make_commits(name, 230) for name in names})
+
+        totals = self.build(client, [edge(name, name + "-230") for name in names])
+
+        self.assertEqual(totals.my_commits, 8 * 230)
+        self.assertEqual(client.max_active, 2)
+        self.assertGreater(len([query for query in client.queries if query[0] == "repo"]), 8)
+
+
+class TestIncrementalRefresh(LocStageTestCase):
+    def test_new_commits_are_added_to_the_existing_totals(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 150)})
+        self.build(client, [edge("me/a", "me/a-150")])
+
+        client.repos["me/a"] = make_commits("me/a", 153, additions=10)
+        client.queries.clear()
+        totals = self.build(client, [edge("me/a", "me/a-153")])
+
+        row = self.saved_rows([edge("me/a", "me/a-153")])[0]
+        self.assertEqual((row["my_commits"], row["additions"], row["head_oid"], row["branch_oid"]), (153, 1530, "me/a-153", "me/a-153"))
+        self.assertEqual(totals.my_commits, 153)
+        self.assertEqual(client.queries, [("batch", {"a": None})]) # one small page reached the last counted commit
+
+    def test_rewritten_history_is_rescanned_from_scratch(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 40)})
+        self.build(client, [edge("me/a", "me/a-40")])
+
+        client.repos["me/a"] = make_commits("me/rewritten", 25, additions=2)
+        self.build(client, [edge("me/a", "me/rewritten-25")])
+
+        row = self.saved_rows([edge("me/a", "me/rewritten-25")])[0]
+        self.assertEqual((row["my_commits"], row["additions"], row["head_oid"]), (25, 50, "me/rewritten-25"))
+
+
+class TestBatchFallback(LocStageTestCase):
+    def test_failed_batch_falls_back_to_per_repository_crawls(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 30), "me/b": make_commits("me/b", 120)})
+        client.batch_status = 502
+        edges = [edge("me/a", "me/a-30"), edge("me/b", "me/b-120")]
+
+        totals = self.build(client, edges)
+
+        self.assertEqual([row["my_commits"] for row in self.saved_rows(edges)], [30, 120])
+        self.assertEqual(totals.my_commits, 150)
+        self.assertIn(("repo", "me/a", None), client.queries)
+        self.assertIn(("repo", "me/b", None), client.queries)
+
+    def test_history_error_on_one_alias_only_falls_back_for_that_repository(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 30), "me/b": make_commits("me/b", 40, additions=2)})
+        client.batch_history_errors = {"me/b"}
+        edges = [edge("me/a", "me/a-30"), edge("me/b", "me/b-40")]
+
+        totals = self.build(client, edges)
+
+        self.assertEqual([(row["my_commits"], row["additions"]) for row in self.saved_rows(edges)], [(30, 300), (40, 80)])
+        self.assertEqual(totals.my_commits, 70)
+        self.assertEqual([query for query in client.queries if query[0] == "repo"], [("repo", "me/b", None)])
+
+
+class TestCheckpointResume(LocStageTestCase):
+    def test_interrupted_crawl_resumes_from_its_checkpoint(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 450, additions=3)})
+        client.repo_pages_left = 2
+        edges = [edge("me/a", "me/a-450")]
+
+        with self.assertRaises(Exception):
+            self.build(client, edges)
+        checkpoint = self.saved_rows(edges)[0]["checkpoint"]
+        self.assertEqual((checkpoint["cursor"], checkpoint["my_commits"]), ("300", 300))
+
+        client.repo_pages_left = None
+        client.queries.clear()
+        totals = self.build(client, edges)
+
+        row = self.saved_rows(edges)[0]
+        self.assertNotIn("checkpoint", row)
+        self.assertEqual((row["my_commits"], row["additions"], row["head_oid"]), (450, 1350, "me/a-450"))
+        self.assertEqual(totals.my_commits, 450)
+        self.assertEqual(client.queries[0], ("batch", {"a": "300"}))
+
+    def test_rejected_checkpoint_cursor_is_dropped_and_the_next_run_starts_over(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 450, additions=3)})
+        client.repo_pages_left = 2
+        edges = [edge("me/a", "me/a-450")]
+        with self.assertRaises(Exception):
+            self.build(client, edges)
+        self.assertEqual(self.saved_rows(edges)[0]["checkpoint"]["cursor"], "300")
+
+        client.repo_pages_left = None
+        client.repos["me/a"] = make_commits("me/rewritten", 250, additions=2) # force-pushed, the saved cursor is gone
+        client.rejected_cursors = {"300"}
+        edges = [edge("me/a", "me/rewritten-250")]
+        client.queries.clear()
+        with self.assertRaises(Exception):
+            self.build(client, edges)
+        self.assertNotIn("checkpoint", self.saved_rows(edges)[0])
+        self.assertEqual(client.queries, [("batch", {"a": "300"}), ("repo", "me/a", "300")])
+
+        client.queries.clear()
+        totals = self.build(client, edges)
+
+        row = self.saved_rows(edges)[0]
+        self.assertEqual((row["my_commits"], row["additions"], row["head_oid"]), (250, 500, "me/rewritten-250"))
+        self.assertEqual(totals.my_commits, 250)
+        self.assertEqual(client.queries[0], ("batch", {"a": None}))
+
+    def test_recursive_loc_continues_a_crawl_rebuilt_from_a_checkpoint(self):
+        client = FakeGitHub({"me/a": make_commits("me/a", 250)})
+        checkpoint = {"cursor": "200", "additions": 2000, "deletions": 200, "my_commits": 200, "head_oid": "me/a-250", "last_oid": None, "branch_oid": "me/a-250"}
+        crawl = loc_history.RepoCrawl.from_checkpoint("me/a", checkpoint)
+        cache = loc_cache.load_loc_cache(storage.cache_filename("me"))
+
+        asyncio.run(today.recursive_loc(client, crawl, cache, {"checkpoint": checkpoint}))
+
+        self.assertTrue(crawl.done)
+        self.assertEqual((crawl.my_commits, crawl.additions, crawl.deletions, crawl.head_oid), (250, 2500, 250, "me/a-250"))
+        self.assertEqual(client.queries, [("repo", "me/a", "200")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import base64
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from github_api import GitHubClient
+from publisher import blob_sha, local_files, pull, push
+
+
+class FakeGitData:
+    """
+    The Git Data endpoints of one repository, backed by dicts
+    """
+
+    def __init__(self, files):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.requests = []
+        tree = self.add_tree({path: self.add_blob(data) for path, data in files.items()})
+        self.head = self.add_commit(tree, [])
+
+    def add_blob(self, data):
+        sha = blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def add_tree(self, entries):
+        sha = f"tree{len(self.trees)}"
+        self.trees[sha] = entries
+        return sha
+
+    def add_commit(self, tree, parents):
+        sha = f"commit{len(self.commits)}"
+        self.commits[sha] = {"sha": sha, "tree": {"sha": tree}, "parents": parents}
+        return sha
+
+    def app(self):
+        prefix = "/repos/me/target/git"
+
+        async def log(request):
+            self.requests.append((request.method, request.path))
+
+        async def get_ref(request):
+            await log(request)
+            etag = f'"{self.head}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304)
+            return web.json_response({"object": {"sha": self.head}}, headers={"ETag": etag})
+
+        async def get_commit(request):
+            await log(request)
+            return web.json_response(self.commits[request.match_info["sha"]])
+
+        async def get_tree(request):
+            await log(request)
+            entries = self.trees[request.match_info["sha"]]
+            return web.json_response({"tree": [{"path": path, "type": "blob", "sha": sha} for path, sha in entries.items()]})
+
+        async def get_blob(request):
+            await log(request)
+            return web.json_response({"content": base64.b64encode(self.blobs[request.match_info["sha"]]).decode()})
+
+        async def create_blob(request):
+            await log(request)
+            body = await request.json()
+            return web.json_response({"sha": self.add_blob(base64.b64decode(body["content"]))}, status=201)
+
+        async def create_tree(request):
+            await log(request)
+            body = await request.json()
+            entries = dict(self.trees[body["base_tree"]], **{entry["path"]: entry["sha"] for entry in body["tree"]})
+            return web.json_response({"sha": self.add_tree(entries)}, status=201)
+
+        async def create_commit(request):
+            await log(request)
+            body = await request.json()
+            return web.json_response({"sha": self.add_commit(body["tree"], body["parents"])}, status=201)
+
+        async def update_ref(request):
+            await log(request)
+            self.head = (await request.json())["sha"]
+            return web.json_response({"object": {"sha": self.head}})
+
+        app = web.Application()
+        app.router.add_get(prefix + "/ref/heads/main", get_ref)
+        app.router.add_get(prefix + "/commits/{sha}", get_commit)
+        app.router.add_get(prefix + "/trees/{sha}", get_tree)
+        app.router.add_get(prefix + "/blobs/{sha}", get_blob)
+        app.router.add_post(prefix + "/blobs", create_blob)
+        app.router.add_post(prefix + "/trees", create_tree)
+        app.router.add_post(prefix + "/commits", create_commit)
+        app.router.add_patch(prefix + "/refs/heads/main", update_ref)
+        return app
+
+
+class TestPublisher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+        self.repo = FakeGitData({
+            "cache/user.json": b'{"repos": {}}',
+            "dark_mode.svg": b"<svg>dark</svg>",
+            "README.md": b"# not published",
+        })
+        self.server = TestServer(self.repo.app())
+        await self.server.start_server()
+        self.client = await GitHubClient("token", api_url=str(self.server.make_url("/"))).__aenter__()
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.server.close()
+
+    def read(self, path):
+        with open(os.path.join(self.root, path), "rb") as f:
+            return f.read()
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+        with open(os.path.join(self.root, path), "wb") as f:
+            f.write(data)
+
+    async def test_pull_downloads_only_missing_or_outdated_published_files(self):
+        self.write("dark_mode.svg", b"<svg>dark</svg>")
+
+        written = await pull(self.client, "me/target", "main", self.root)
+
+        self.assertEqual(written, ["cache/user.json"])
+        self.assertEqual(self.read("cache/user.json"), b'{"repos": {}}')
+        self.assertFalse(os.path.exists(os.path.join(self.root, "README.md")))
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "arts")))
+
+    async def test_push_uploads_only_changed_files_in_one_commit(self):
+        await pull(self.client, "me/target", "main", self.root)
+        self.write("dark_mode.svg", b"<svg>new</svg>")
+        self.write("arts/ascii.txt", b"art")
+        self.write("cache/user.json.tmp", b'{"half": ') # left by an interrupted write
+        parent = self.repo.head
+        self.repo.requests.clear()
+
+        sha = await push(self.client, "me/target", "main", "Update GitHub metrics", root=self.root)
+
+        self.assertEqual(sha, self.repo.head)
+        self.assertEqual(self.repo.commits[sha]["parents"], [parent])
+        tree = self.repo.trees[self.repo.commits[sha]["tree"]["sha"]]
+        self.assertEqual(self.repo.blobs[tree["dark_mode.svg"]], b"<svg>new</svg>")
+        self.assertEqual(self.repo.blobs[tree["arts/ascii.txt"]], b"art")
+        self.assertIn("README.md", tree)
+        self.assertNotIn("cache/user.json.tmp", tree)
+        self.assertEqual([request for request in self.repo.requests if request[1].endswith("/blobs")], [("POST", "/repos/me/target/git/blobs")] * 2)
+
+    async def test_push_without_changes_does_not_commit(self):
+        await pull(self.client, "me/target", "main", self.root)
+        head = self.repo.head
+        self.repo.requests.clear()
+
+        self.assertIsNone(await push(self.client, "me/target", "main", "Update GitHub metrics", root=self.root))
+        self.assertEqual(self.repo.head, head)
+        self.assertEqual(self.repo.requests, [("GET", "/repos/me/target/git/ref/heads/main")]) # answered with a 304
+
+    async def test_tree_is_only_listed_again_when_the_ref_moves_elsewhere(self):
+        await pull(self.client, "me/target", "main", self.root)
+        self.write("dark_mode.svg", b"<svg>new</svg>")
+        await push(self.client, "me/target", "main", "Update GitHub metrics", root=self.root)
+        self.repo.requests.clear()
+
+        self.assertEqual(await pull(self.client, "me/target", "main", self.root), [])
+        self.assertEqual([path for _, path in self.repo.requests], ["/repos/me/target/git/ref/heads/main"])
+
+        tree = dict(self.repo.trees[self.repo.commits[self.repo.head]["tree"]["sha"]], **{"cache/user.json": self.repo.add_blob(b"{}")})
+        self.repo.head = self.repo.add_commit(self.repo.add_tree(tree), [self.repo.head]) # pushed by someone else
+        self.repo.requests.clear()
+
+        self.assertEqual(await pull(self.client, "me/target", "main", self.root), ["cache/user.json"])
+        self.assertEqual([path.rsplit("/", 2)[1] for _, path in self.repo.requests], ["heads", "commits", "trees", "blobs"])
+        self.assertTrue(os.path.isdir(os.path.join(self.root, ".publisher")))
+        self.assertEqual([path for path in local_files(self.root) if ".publisher" in path], []) # never pushed
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("aiohttp", "lxml", "dateutil", "lastfm")
+IMPORT_BUDGET_US = 400_000 # importing today takes ~150 ms cold, aiohttp alone used to add ~300 ms
+
+
+def import_times(module):
+    """
+    Imports module in a fresh interpreter under -X importtime, without any configuration in the environment
+    Returns {module name: cumulative microseconds}
+    """
+    env = {key: value for key, value in os.environ.items() if key not in ("ACCESS_TOKEN", "USER_NAME")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr.splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit(): # skips the header line
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    def test_importing_today_needs_no_configuration_and_no_heavy_modules(self):
+        times = import_times("today")
+
+        loaded = {name.split(".")[0] for name in times}
+        self.assertEqual(loaded & set(HEAVY_MODULES), set())
+
+    def test_import_time_budget(self):
+        best = min(import_times("today")["today"] for _ in range(3))
+
+        self.assertLess(best, IMPORT_BUDGET_US)
+
+
+if __name__ == "__main__":
+    unittest.main()
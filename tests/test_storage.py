@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+import storage
+
+
+class TestKeepLoaded(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.filename = os.path.join(self.tmp.name, "cache", "state.json")
+        self.addCleanup(setattr, storage, "LOADED", storage.LOADED)
+        storage.LOADED = None
+        storage.keep_loaded()
+
+    def test_written_file_is_reused_without_parsing(self):
+        data = {"a": [1, 2]}
+        storage.write_json(self.filename, data)
+
+        self.assertIs(storage.read_json(self.filename), data)
+
+    def test_file_changed_on_disk_is_read_again(self):
+        storage.write_json(self.filename, {"a": 1})
+        with open(self.filename, "w") as f:
+            f.write('{"a": 22}')
+
+        self.assertEqual(storage.read_json(self.filename), {"a": 22})
+
+    def test_read_hands_the_file_over_until_it_is_written_back(self):
+        storage.write_json(self.filename, {"a": 1})
+        storage.read_json(self.filename)["a"] = 2 # mutated but never saved, e.g. by a failed run
+
+        self.assertEqual(storage.read_json(self.filename), {"a": 1})
+
+    def test_forget_loaded(self):
+        data = {"a": 1}
+        storage.write_json(self.filename, data)
+        storage.forget_loaded()
+
+        self.assertIsNot(storage.read_json(self.filename), data)
+        self.assertEqual(storage.read_json(self.filename), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from svg_template import SvgTemplate
+
+TEMPLATE = """<?xml version='1.0' encoding='utf-8'?>
+<svg xmlns="http://www.w3.org/2000/svg">
+<text x="390" y="30" fill="#c9d1d9"><tspan>old name</tspan> --</text>
+<text x="15" y="30" id="ascii" data-filename="arts/a.txt"><tspan>A</tspan></text>
+<text x="390" y="60" id="lastfm_block"><tspan x="390" y="60">- Last.fm Recent Scrobbles</tspan></text>
+<text x="390" y="390" id="github_stats"><tspan x="390" y="390">- GitHub Stats</tspan> --</text>
+<rect fill="#c9d1d9"/>
+<rect fill="#24292f"/>
+</svg>"""
+
+
+class TestSvgTemplate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def template(self, name):
+        filename = os.path.join(self.tmp.name, name)
+        with open(filename, "w") as f:
+            f.write(TEMPLATE)
+        return SvgTemplate(filename)
+
+    def test_blocks_are_indexed_by_id_and_data_filename_is_read_from_the_art_block(self):
+        template = self.template("dark_mode.svg")
+
+        self.assertEqual(set(template.by_id), {"ascii", "lastfm_block", "github_stats"})
+        self.assertEqual(template.data_filename, "arts/a.txt")
+        self.assertEqual(template.identity.text, "old name")
+
+    def test_apply_replaces_only_the_given_blocks_and_swaps_theme_colors(self):
+        template = self.template("light_mode.svg")
+
+        template.apply({"ascii": '<text id="ascii" data-filename="arts/b.txt" fill="#c9d1d9"><tspan>B</tspan></text>'}, "me")
+        template.write()
+        with open(template.filename) as f:
+            svg = f.read()
+
+        self.assertEqual(template.data_filename, "arts/b.txt")
+        self.assertIn('<tspan>B</tspan>', svg)
+        self.assertIn('- Last.fm Recent Scrobbles', svg)
+        self.assertNotIn('fill="#c9d1d9"', svg)
+        self.assertIn('<tspan>me</tspan> -', svg)
+        self.assertIn('<tspan x="390" y="390">- GitHub Stats</tspan> -—', svg)
+
+    def test_missing_block_is_skipped(self):
+        template = self.template("dark_mode.svg")
+
+        template.apply({"languages_block": '<text id="languages_block"/>'}, "me")
+
+        self.assertNotIn("languages_block", template.by_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
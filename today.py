@@ -1,36 +1,82 @@
 
 import asyncio
+import contextlib
 import datetime
-import hashlib
 import os
 import time
 
-import aiohttp
-from dateutil import relativedelta
-from lxml import etree
 from loguru import logger
 
 from art import load_ascii_from_file, ascii_to_svg, get_random_file
+import contributions
+import fingerprint
+import freshness
+import github_api
 from github_stats import generate_github_stats_svg
-from languages_svg import get_most_used_languages, generate_languages_svg
-from lastfm import lastfm_getter
-from svg_header import make_header_tail
+from languages_svg import get_most_used_languages, generate_languages_svg, repository_languages
+import language_cache
+import loc_cache
+import loc_history
+import storage
+
+SVG_FILES = ('dark_mode.svg', 'light_mode.svg')
+NO_CHANGES_EXIT_CODE = 3 # a.py exits with it when neither the SVGs nor cache/ changed, so run.sh skips the push
+QUERY_COUNT = {'profile_getter': 0, 'inventory_query': 0, 'recursive_loc': 0, 'graph_commits': 0, 'loc_batch': 0, 'language_batch': 0}
+OWNER_ID = {}
+OWNER_AFFILIATIONS = ['OWNER', 'COLLABORATOR', 'ORGANIZATION_MEMBER']
+LOC_HISTORY_PATH = ('data', 'repository', 'defaultBranchRef', 'target', 'history')
 
+# Read from the environment by load_config, so importing this module reads nothing and needs no token
 # Fine-grained personal access token with All Repositories access:
 # Account permissions: read:Followers, read:Starring, read:Watching
 # Repository permissions: read:Commit statuses, read:Contents, read:Issues, read:Metadata, read:Pull Requests
 # Issues and pull requests permissions not needed at the moment, but may be used in the future
-HEADERS = {'authorization': 'token '+ os.environ['ACCESS_TOKEN']}
-PROXY = os.environ.get('PROXY')
-USER_NAME = os.environ['USER_NAME']
-EXCLUDED_REPOS = os.environ.get('EXCLUDED_REPOS', '').split(',') if os.environ.get('EXCLUDED_REPOS') else []
-EXCLUDED_LANGUAGES = os.environ.get('EXCLUDED_LANGUAGES', '').split(',') if os.environ.get('EXCLUDED_LANGUAGES') else [] #only for most languages used
-LASTFM_TOKEN = os.environ.get('LASTFM_TOKEN')
-LASTFM_USER = os.environ.get('LASTFM_USER')
-SVG_HEADER_IDENTITY = os.environ.get('SVG_HEADER_IDENTITY', USER_NAME)
-QUERY_COUNT = {'user_getter': 0, 'follower_getter': 0, 'graph_repos_stars': 0, 'recursive_loc': 0, 'graph_commits': 0, 'loc_query': 0}
-OWNER_ID = {}
-GITHUB_API_SEMAPHORE = asyncio.Semaphore(int(os.environ.get('GITHUB_API_CONCURRENCY', '4')))
+ACCESS_TOKEN = None
+PROXY = None
+USER_NAME = None
+EXCLUDED_REPOS = []
+EXCLUDED_LANGUAGES = [] # only for most languages used
+LASTFM_TOKEN = None
+LASTFM_USER = None
+SVG_HEADER_IDENTITY = None
+METRICS_DATA_DIR = None # cache/, arts/ and the SVGs live here
+GITHUB_API_CONCURRENCY = 4
+GITHUB_API_MAX_CONCURRENCY = 16
+LOC_REFRESH_CONCURRENCY = 4
+LOC_BATCH_SIZE = 20 # repositories per aliased history query
+LOC_BATCH_COMMITS = 500 # commit nodes per aliased history query
+LOC_CHECKPOINT_PAGES = 5 # history pages between crawl checkpoints
+METRIC_TTLS = freshness.parse_ttls(None) # seconds a fetched metric is reused before it is fetched again
+LANGUAGE_BATCH_SIZE = 50 # repositories per aliased languages query
+LIFETIME_CONTRIBUTIONS = False # the all-time contributions row needs a template with room for one more stats line
+
+
+def load_config(environ=os.environ):
+    """
+    Reads the configuration globals from the environment, raising a KeyError if ACCESS_TOKEN or USER_NAME is missing
+    Called once by main (or by the daemon before it opens its client)
+    """
+    global ACCESS_TOKEN, PROXY, USER_NAME, EXCLUDED_REPOS, EXCLUDED_LANGUAGES, LASTFM_TOKEN, LASTFM_USER, SVG_HEADER_IDENTITY, METRICS_DATA_DIR
+    global GITHUB_API_CONCURRENCY, GITHUB_API_MAX_CONCURRENCY, LOC_REFRESH_CONCURRENCY, LOC_BATCH_SIZE, LOC_BATCH_COMMITS, LOC_CHECKPOINT_PAGES, METRIC_TTLS, LANGUAGE_BATCH_SIZE
+    global LIFETIME_CONTRIBUTIONS
+    ACCESS_TOKEN = environ['ACCESS_TOKEN']
+    PROXY = environ.get('PROXY')
+    USER_NAME = environ['USER_NAME']
+    EXCLUDED_REPOS = environ.get('EXCLUDED_REPOS', '').split(',') if environ.get('EXCLUDED_REPOS') else []
+    EXCLUDED_LANGUAGES = environ.get('EXCLUDED_LANGUAGES', '').split(',') if environ.get('EXCLUDED_LANGUAGES') else []
+    LASTFM_TOKEN = environ.get('LASTFM_TOKEN')
+    LASTFM_USER = environ.get('LASTFM_USER')
+    SVG_HEADER_IDENTITY = environ.get('SVG_HEADER_IDENTITY', USER_NAME)
+    METRICS_DATA_DIR = os.path.abspath(environ['METRICS_DATA_DIR']) if environ.get('METRICS_DATA_DIR') else None
+    GITHUB_API_CONCURRENCY = int(environ.get('GITHUB_API_CONCURRENCY', '4'))
+    GITHUB_API_MAX_CONCURRENCY = int(environ.get('GITHUB_API_MAX_CONCURRENCY', '16'))
+    LOC_REFRESH_CONCURRENCY = int(environ.get('LOC_REFRESH_CONCURRENCY', GITHUB_API_CONCURRENCY))
+    LOC_BATCH_SIZE = int(environ.get('LOC_BATCH_SIZE', '20'))
+    LOC_BATCH_COMMITS = int(environ.get('LOC_BATCH_COMMITS', '500'))
+    LOC_CHECKPOINT_PAGES = max(1, int(environ.get('LOC_CHECKPOINT_PAGES', '5')))
+    METRIC_TTLS = freshness.parse_ttls(environ.get('METRICS_TTL'))
+    LANGUAGE_BATCH_SIZE = int(environ.get('LANGUAGE_BATCH_SIZE', '50'))
+    LIFETIME_CONTRIBUTIONS = environ.get('LIFETIME_CONTRIBUTIONS', '').lower() in ('1', 'true', 'yes')
 
 
 def daily_readme(birthday):
@@ -38,6 +84,7 @@ def daily_readme(birthday):
     Returns the length of time since I was born
     e.g. 'XX years, XX months, XX days'
     """
+    from dateutil import relativedelta
     diff = relativedelta.relativedelta(datetime.datetime.today(), birthday)
     return '{} {}, {} {}, {} {}{}'.format(
         diff.years, 'year' + format_plural(diff.years),
@@ -58,18 +105,18 @@ def format_plural(unit):
     return 's' if unit != 1 else ''
 
 
-async def simple_request(session, func_name, query, variables):
+async def simple_request(client, func_name, query, variables):
     """
     Returns a request, or raises an Exception if the response does not succeed.
+    Goes through the client's rate limiter, which waits out rate limits before giving up
     """
-    async with GITHUB_API_SEMAPHORE:
-        async with session.post('https://api.github.com/graphql', json={'query': query, 'variables':variables}, headers=HEADERS) as response:
-            if response.status == 200:
-                return await response.json()
-            raise Exception(func_name, ' has failed with a', response.status, await response.text(), QUERY_COUNT)
+    status, body = await client.graphql(query, variables)
+    if status == 200:
+        return body
+    raise Exception(func_name, ' has failed with a', status, body, QUERY_COUNT)
 
 
-async def graph_commits(session, start_date, end_date):
+async def graph_commits(client, start_date, end_date):
     """
     Uses GitHub's GraphQL v4 API to return my total commit count
     """
@@ -85,35 +132,27 @@ async def graph_commits(session, start_date, end_date):
         }
     }'''
     variables = {'start_date': start_date,'end_date': end_date, 'login': USER_NAME}
-    request = await simple_request(session, graph_commits.__name__, query, variables)
+    request = await simple_request(client, graph_commits.__name__, query, variables)
     return int(request['data']['user']['contributionsCollection']['contributionCalendar']['totalContributions'])
 
 
-async def get_recent_commits_and_streak(session):
-    """
-    Gets commit data for the last 7 days and calculates current streak
-    """
-    end_date = datetime.datetime.now(datetime.timezone.utc)
-    start_date_7d = end_date - datetime.timedelta(days=7)
-
-    recent_commits = await graph_commits(session, start_date_7d.isoformat(), end_date.isoformat())
-
-    streak = await calculate_current_streak(session)
-
-    return recent_commits, streak
-
-
-async def calculate_current_streak(session):
+async def profile_getter(client, username, previous_followers=None):
     """
-    Calculates the current commit streak by checking the contribution calendar
+    Returns the account ID, creation time, follower count, last-7-days contribution total and contribution streak
+    of the user, all from one GraphQL query
+    The contribution calendar is kept in cache/, only its trailing days that can still change are queried again
+    previous_followers (the count stored by the last run) is reused if the follower count is missing from the response
     """
-    end_date = datetime.datetime.now(datetime.timezone.utc)
-    start_date = end_date - datetime.timedelta(days=366)
-
+    query_count('profile_getter')
     query = '''
-    query($start_date: DateTime!, $end_date: DateTime!, $login: String!) {
+    query($login: String!, $calendar_start: DateTime!, $end_date: DateTime!) {
         user(login: $login) {
-            contributionsCollection(from: $start_date, to: $end_date) {
+            id
+            createdAt
+            followers {
+                totalCount
+            }
+            contributionsCollection(from: $calendar_start, to: $end_date) {
                 contributionCalendar {
                     weeks {
                         contributionDays {
@@ -125,67 +164,95 @@ async def calculate_current_streak(session):
             }
         }
     }'''
-
+    end_date = datetime.datetime.now(datetime.timezone.utc)
+    today = end_date.date()
+    filename = storage.cache_filename(username, 'calendar.json')
+    days = contributions.load_calendar(filename)
     variables = {
-        'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'login': username,
+        'calendar_start': contributions.calendar_start(days, today).isoformat() + 'T00:00:00Z',
         'end_date': end_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
-        'login': USER_NAME
+    }
+    request = await simple_request(client, profile_getter.__name__, query, variables)
+    user = (request.get('data') or {}).get('user')
+    if user is None:
+        raise Exception(profile_getter.__name__, ' has failed with', request.get('errors'), QUERY_COUNT)
+    # A partial GraphQL error nulls only its own field, so the rest of the profile is still used
+    if user.get('contributionsCollection') is not None:
+        days = contributions.merge_calendar(days, contributions.calendar_days(user['contributionsCollection']['contributionCalendar']), today)
+        contributions.save_calendar(filename, days)
+    else:
+        logger.warning('Contribution calendar missing from the profile query ({errors}), using the cached one', errors=request.get('errors'))
+    if user.get('followers') is not None:
+        followers = int(user['followers']['totalCount'])
+    elif previous_followers is not None:
+        logger.warning('Follower count missing from the profile query ({errors}), using the stored one', errors=request.get('errors'))
+        followers = previous_followers
+    else:
+        raise Exception(profile_getter.__name__, ' has no follower count', request.get('errors'), QUERY_COUNT)
+    return {
+        'id': user['id'],
+        'created_at': user['createdAt'],
+        'followers': followers,
+        'recent_commits': contributions.window_total(days, today, 7),
+        'streak': contributions.current_streak(days, today),
     }
 
-    try:
-        request = await simple_request(session, "calculate_current_streak", query, variables)
-        weeks = request['data']['user']['contributionsCollection']['contributionCalendar']['weeks']
-
-        all_days = []
-        for week in weeks:
-            all_days.extend(week['contributionDays'])
-
-        all_days.sort(key=lambda x: x['date'], reverse=True)
-
-        streak = 0
-        today_date = datetime.datetime.now(datetime.timezone.utc).date()
-
-        for day in all_days:
-            day_date = datetime.datetime.strptime(day['date'], '%Y-%m-%d').date()
-            count = day['contributionCount']
-
-            if day_date == today_date:
-                if count > 0:
 
-                    streak += 1
-                else:
+async def lifetime_contributions(client, created_at):
+    """
+    Returns the total number of contributions since the account was created
+    GitHub caps a contributionsCollection at one year, so every year is a graph_commits query of its own, but the totals
+    of closed years never change: they are saved in cache/ and only the current year is queried again
+    """
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    filename = storage.cache_filename(USER_NAME, 'years.json')
+    totals = contributions.load_year_totals(filename)
+    years = contributions.years_to_query(totals, int(created_at[:4]), today)
+    counts = await asyncio.gather(*(graph_commits(client, f'{year}-01-01T00:00:00Z', f'{year}-12-31T23:59:59Z') for year in years))
+    totals.update(zip(map(str, years), counts))
+    contributions.save_year_totals(filename, {year: total for year, total in totals.items() if contributions.year_is_closed(int(year), today)})
+    return sum(totals.values())
 
-                    continue
-            else:
-                if count > 0:
-                    streak += 1
-                else:
 
-                    break
+def load_owner_id(username):
+    """
+    Returns the account ID saved by the previous run, or None
+    It never changes for a login, so the LOC stage doesn't have to wait for the profile query
+    """
+    owner = storage.read_json(storage.cache_filename(username, 'owner.json'), {})
+    return owner.get('id') if owner.get('login') == username else None
 
-        return streak
 
-    except Exception as e:
-        logger.exception("Failed to calculate current streak")
-        return 0
+def save_owner_id(username, owner_id):
+    storage.write_json(storage.cache_filename(username, 'owner.json'), {'login': username, 'id': owner_id})
 
 
-async def graph_repos_stars(session, count_type, owner_affiliation, cursor=None, add_loc=0, del_loc=0):
+async def inventory_query(client, owner_affiliation):
     """
-    Uses GitHub's GraphQL v4 API to return my total repository, star, or lines of code count.
+    Uses GitHub's GraphQL v4 API to list every repository I am affiliated with (with respect to owner_affiliation)
+    This is the only repository listing of a run, the repo, star, LOC and language stats are all derived from it
+    Queries 100 repos at a time, only asking for cheap fields: the default branch head oid instead of history.totalCount
+    (which is expensive for GitHub to compute and used to force 60 repos per page to avoid 502 errors)
     """
-    query_count('graph_repos_stars')
     query = '''
     query ($owner_affiliation: [RepositoryAffiliation], $login: String!, $cursor: String) {
         user(login: $login) {
             repositories(first: 100, after: $cursor, ownerAffiliations: $owner_affiliation) {
-                totalCount
                 edges {
                     node {
                         ... on Repository {
+                            id
                             nameWithOwner
-                            stargazers {
-                                totalCount
+                            owner {
+                                login
+                            }
+                            stargazerCount
+                            pushedAt
+                            defaultBranchRef {
+                                target {
+                                    oid
+                                }
                             }
                         }
                     }
@@ -197,148 +264,187 @@ async def graph_repos_stars(session, count_type, owner_affiliation, cursor=None,
             }
         }
     }'''
-    variables = {'owner_affiliation': owner_affiliation, 'login': USER_NAME, 'cursor': cursor}
-    request = await simple_request(session, graph_repos_stars.__name__, query, variables)
-    repositories = request['data']['user']['repositories']
-    current_stars = stars_counter(repositories['edges'])
+    variables = {'owner_affiliation': owner_affiliation, 'login': USER_NAME}
+    edges = []
+    async for repositories in github_api.paginate(graphql_requester(client, inventory_query.__name__), query, variables, ('data', 'user', 'repositories')):
+        edges.extend(repositories['edges'])
+    return edges
 
-    if repositories['pageInfo']['hasNextPage']:
-        if count_type == 'repos':
-            return await graph_repos_stars(session, count_type, owner_affiliation, repositories['pageInfo']['endCursor'], add_loc, del_loc)
-        if count_type == 'stars':
-            next_page_stars = await graph_repos_stars(session, count_type, owner_affiliation, repositories['pageInfo']['endCursor'], add_loc, del_loc)
-            return current_stars + next_page_stars
 
-    if count_type == 'repos':
-        return repositories['totalCount']
-    elif count_type == 'stars':
-        return current_stars
+def owned_repositories(edges):
+    """
+    Returns the inventory edges of repositories owned by me (the OWNER affiliation)
+    """
+    return [edge for edge in edges if edge['node']['owner']['login'].lower() == USER_NAME.lower()]
 
 
-async def recursive_loc(session, owner, repo_name, data, cache_comment, addition_total=0, deletion_total=0, my_commits=0, cursor=None):
+def repository_counts(edges):
+    """
+    Returns the repo, star and contributed counts from the inventory, as the OWNER and all-affiliation listings counted them
+    EXCLUDED_REPOS only applies to the LOC and language stats, never to these counts
     """
-    Uses GitHub's GraphQL v4 API and cursor pagination to fetch 100 commits from a repository at a time
+    owned = owned_repositories(edges)
+    return {'repos': len(owned), 'stars': stars_counter(owned), 'contributed': len(edges)}
+
+
+async def recursive_loc(client, crawl, cache, entry):
+    """
+    Uses GitHub's GraphQL v4 API and cursor pagination to fetch 100 of my commits from a repository at a time
+    Continues the crawl from crawl.cursor, stopping at crawl.last_oid if it is set
+    Progress is checkpointed into the repository's cache entry every LOC_CHECKPOINT_PAGES pages and on failure
     """
-    query_count('recursive_loc')
     query = '''
-    query ($repo_name: String!, $owner: String!, $cursor: String) {
+    query ($repo_name: String!, $owner: String!, $cursor: String, $author_id: ID!) {
         repository(name: $repo_name, owner: $owner) {
             defaultBranchRef {
                 target {
                     ... on Commit {
-                        history(first: 100, after: $cursor) {
-                            totalCount
-                            edges {
-                                node {
-                                    ... on Commit {
-                                        committedDate
-                                    }
-                                    author {
-                                        user {
-                                            id
-                                        }
-                                    }
-                                    deletions
-                                    additions
-                                }
-                            }
-                            pageInfo {
-                                endCursor
-                                hasNextPage
-                            }
+                        history(first: 100, after: $cursor, author: {id: $author_id}) {''' + loc_history.HISTORY_FIELDS + '''
                         }
                     }
                 }
             }
-        }
+        }''' + github_api.RATE_LIMIT_FIELDS + '''
     }'''
-    variables = {'repo_name': repo_name, 'owner': owner, 'cursor': cursor}
-    for attempt in range(3):
-        try:
-            async with session.post('https://api.github.com/graphql', json={'query': query, 'variables':variables}, headers=HEADERS) as response:
-                # print(response.status)
-                if response.status == 200:
-                    json_data = await response.json()
-                    if json_data['data']['repository']['defaultBranchRef'] != None:
-                        return await loc_counter_one_repo(session, owner, repo_name, data, cache_comment, json_data['data']['repository']['defaultBranchRef']['target']['history'], addition_total, deletion_total, my_commits)
-                    else: return 0
-                await force_close_file(data, cache_comment)
-                if response.status == 403:
+
+    async def request(query, variables):
+        query_count('recursive_loc')
+        for attempt in range(3):
+            try:
+                start = time.perf_counter()
+                status, json_data = await client.graphql(query, variables)
+                if status == 200:
+                    crawl.elapsed += time.perf_counter() - start
+                    if not json_data.get('errors'):
+                        return json_data
+                    if crawl.resumed: # The saved cursor may be gone after a force-push, start this repo over next time
+                        entry.pop('checkpoint', None)
+                    await force_close_file(cache)
+                    raise Exception('recursive_loc() has failed with', json_data['errors'], QUERY_COUNT)
+                entry['checkpoint'] = crawl.checkpoint()
+                await force_close_file(cache)
+                if status == 403:
                     raise Exception('Too many requests in a short amount of time!\nYou\'ve hit the non-documented anti-abuse limit!')
-                raise Exception('recursive_loc() has failed with a', response.status, await response.text(), QUERY_COUNT)
-        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
-            if attempt == 2:
-                raise e
-            logger.warning("Retry {attempt} failed in recursive_loc: {error}", attempt=attempt + 1, error=e)
-            await asyncio.sleep(2 ** attempt)
+                raise Exception('recursive_loc() has failed with a', status, json_data, QUERY_COUNT)
+            except github_api.transient_errors() as e:
+                if attempt == 2:
+                    raise e
+                logger.warning("Retry {attempt} failed in recursive_loc: {error}", attempt=attempt + 1, error=e)
+                await asyncio.sleep(2 ** attempt)
+
+    variables = {'repo_name': crawl.name, 'owner': crawl.owner, 'author_id': OWNER_ID['id']}
+    pages = github_api.paginate(request, query, variables, LOC_HISTORY_PATH, cursor=crawl.cursor)
+    async with contextlib.aclosing(pages):
+        async for history in pages:
+            loc_counter_one_repo(crawl, history)
+            if crawl.done:
+                break
+            if crawl.pages % LOC_CHECKPOINT_PAGES == 0:
+                checkpoint_crawls([(crawl, entry)], cache)
+    if not crawl.done: # No default branch, so no history page was returned
+        crawl.apply_page(None)
+    return crawl
 
 
-async def loc_counter_one_repo(session, owner, repo_name, data, cache_comment, history, addition_total, deletion_total, my_commits):
+def checkpoint_crawls(crawls, cache):
     """
-    Recursively call recursive_loc (since GraphQL can only search 100 commits at a time)
-    only adds the LOC value of commits authored by me
+    Stores the cursor and partial totals of unfinished crawls in their cache entries and saves the cache atomically
+    The next run resumes those repositories instead of starting them from their first commit
     """
-    # print(repo_name)
-    for node in history['edges']:
-        if node['node']['author']['user'] == OWNER_ID:
-            my_commits += 1
-            addition_total += node['node']['additions']
-            deletion_total += node['node']['deletions']
+    for crawl, entry in crawls:
+        entry['checkpoint'] = crawl.checkpoint()
+    loc_cache.save_loc_cache(storage.cache_filename(USER_NAME), cache)
 
-    if history['edges'] == [] or not history['pageInfo']['hasNextPage']:
-        return addition_total, deletion_total, my_commits
-    else: return await recursive_loc(session, owner, repo_name, data, cache_comment, addition_total, deletion_total, my_commits, history['pageInfo']['endCursor'])
 
+def loc_counter_one_repo(crawl, history):
+    """
+    Adds one page of a repository's history to its crawl (GraphQL can only search 100 commits at a time)
+    The history is filtered by author on GitHub's side, so every commit in it is mine
+    """
+    crawl.apply_page(history)
 
-async def loc_query(session, owner_affiliation, comment_size=0, force_cache=False, cursor=None, edges=[]):
+
+async def fetch_history_batch(client, semaphore, crawls, cache):
     """
-    Uses GitHub's GraphQL v4 API to query all the repositories I have access to (with respect to owner_affiliation)
-    Queries 60 repos at a time, because larger queries give a 502 timeout error and smaller queries send too many
-    requests and also give a 502 error.
-    Returns the total number of lines of code in all repositories
+    Fetches the next history page of several repositories in one aliased GraphQL query
+    and fans each page back out to its repository's crawl
+    If the batch itself fails (a timeout, or a 502 when it is too expensive for GitHub to compute), its crawls are
+    left untouched and recursive_loc crawls each repository on its own instead
     """
-    query_count('loc_query')
-    query = '''
-    query ($owner_affiliation: [RepositoryAffiliation], $login: String!, $cursor: String) {
-        user(login: $login) {
-            repositories(first: 60, after: $cursor, ownerAffiliations: $owner_affiliation) {
-            edges {
-                node {
-                    ... on Repository {
-                        nameWithOwner
-                        defaultBranchRef {
-                            target {
-                                ... on Commit {
-                                    history {
-                                        totalCount
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-                pageInfo {
-                    endCursor
-                    hasNextPage
-                }
+    query_count('loc_batch')
+    query, variables = loc_history.build_history_batch_query(crawls, OWNER_ID['id'])
+    async with semaphore:
+        for attempt in range(3):
+            try:
+                start = time.perf_counter()
+                request = await simple_request(client, fetch_history_batch.__name__, query, variables)
+                break
+            except github_api.transient_errors() as e:
+                if attempt == 2:
+                    logger.warning("History batch of {count} repositories failed ({error}), crawling them one by one", count=len(crawls), error=e)
+                    return
+                logger.warning("Retry {attempt} failed in fetch_history_batch: {error}", attempt=attempt + 1, error=e)
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e: # simple_request raises on any status but 200
+                logger.warning("History batch of {count} repositories failed ({error}), crawling them one by one", count=len(crawls), error=e)
+                return
+    elapsed = time.perf_counter() - start
+    data = request.get('data') or {}
+    failed = loc_history.failed_aliases(request)
+    for index, crawl in enumerate(crawls):
+        alias = f'r{index}'
+        if alias not in data or alias in failed: # Partial error, recursive_loc retries this repository on its own
+            if crawl.resumed: # and drops its checkpoint if the saved cursor is rejected again
+                logger.warning("History batch could not resume {repo} from its checkpoint", repo=crawl.name_with_owner)
+            continue
+        crawl.elapsed += elapsed
+        crawl.apply_page(loc_history.history_from_repository(data[alias]))
+
+
+async def language_query(client, nodes):
+    """
+    Returns the languages of every repository node (one repository_languages dict per node)
+    Languages are cached per repository with the pushedAt they were fetched at, so only repos pushed since the last run
+    are queried, LANGUAGE_BATCH_SIZE at a time through aliased queries
+    """
+    filename = storage.cache_filename(USER_NAME, 'languages.json')
+    cache = language_cache.load_language_cache(filename)
+    stale = language_cache.sync_repos(cache, nodes)
+
+    async def fetch_batch(batch):
+        query_count('language_batch')
+        query, variables = language_cache.build_languages_batch_query(batch)
+        data = (await simple_request(client, 'language_batch', query, variables)).get('data') or {}
+        for index, node in enumerate(batch):
+            repository = data.get(f'r{index}')
+            if repository is None: # partial error, keep the previous languages and retry next run
+                continue
+            cache['repos'][node['id']] = {
+                'name': node['nameWithOwner'],
+                'pushed_at': node['pushedAt'],
+                'languages': repository_languages(repository['languages']),
             }
-        }
-    }'''
-    variables = {'owner_affiliation': owner_affiliation, 'login': USER_NAME, 'cursor': cursor}
-    request = await simple_request(session, loc_query.__name__, query, variables)
-    if request['data']['user']['repositories']['pageInfo']['hasNextPage']:   # If repository data has another page
-        edges += request['data']['user']['repositories']['edges']            # Add on to the LoC count
-        return await loc_query(session, owner_affiliation, comment_size, force_cache, request['data']['user']['repositories']['pageInfo']['endCursor'], edges)
-    else:
-        return await cache_builder(session, edges + request['data']['user']['repositories']['edges'], comment_size, force_cache)
 
+    await asyncio.gather(*(fetch_batch(stale[i:i + LANGUAGE_BATCH_SIZE]) for i in range(0, len(stale), LANGUAGE_BATCH_SIZE)))
+    language_cache.save_language_cache(filename, cache)
+    logger.info('Languages: {stale} of {total} repositories refreshed', stale=len(stale), total=len(nodes))
+    return [cache['repos'][node['id']]['languages'] for node in nodes if node['id'] in cache['repos']]
 
-async def cache_builder(session, edges, comment_size, force_cache, loc_add=0, loc_del=0):
+
+async def loc_query(client, edges, comment_size=0, force_cache=False):
+    """
+    Counts the lines of code in every repository of the inventory (see inventory_query)
+    Returns the lines of code and commit totals of all repositories (see cache_builder)
     """
-    Checks each repository in edges to see if it has been updated since the last time it was cached
+    return await cache_builder(client, edges, comment_size, force_cache)
+
+
+async def cache_builder(client, edges, comment_size, force_cache):
+    """
+    Checks each repository in edges to see if its default branch head has moved since the last time it was cached
     If it has, run recursive_loc on that repository to update the LOC count
     Excludes repositories specified in EXCLUDED_REPOS environment variable
+    Returns a loc_cache.LocAggregate with the LOC and commit totals of every repository
     """
     # Filter out excluded repositories
     excluded_repos = get_excluded_list(EXCLUDED_REPOS)
@@ -352,72 +458,99 @@ async def cache_builder(session, edges, comment_size, force_cache, loc_add=0, lo
         # print(edges)
         logger.info("Filtered out {count} excluded repositories: {repos}", count=len(excluded_repos), repos=', '.join(excluded_repos))
 
-    cached = True # Assume all repositories are cached
-    filename = 'cache/'+hashlib.sha256(USER_NAME.encode('utf-8')).hexdigest()+'.txt' # Create a unique filename for each user
-    try:
-        with open(filename, 'r') as f:
-            data = f.readlines()
-    except FileNotFoundError: # If the cache file doesn't exist, create it
-        data = []
-        if comment_size > 0:
-            for _ in range(comment_size): data.append('This line is a comment block. Write whatever you want here.\n')
-        with open(filename, 'w') as f:
-            f.writelines(data)
-
-    if len(data)-comment_size != len(edges) or force_cache: # If the number of repos has changed, or force_cache is True
-        cached = False
-        flush_cache(edges, filename, comment_size)
-        with open(filename, 'r') as f:
-            data = f.readlines()
-
-    cache_comment = data[:comment_size] # save the comment block
-    data = data[comment_size:] # remove those lines
+    filename = storage.cache_filename(USER_NAME) # Create a unique filename for each user
+    cache = loc_cache.load_loc_cache(filename, storage.cache_filename(USER_NAME, 'txt'), comment_size)
+    if force_cache:
+        flush_cache(cache)
+    entries, added_repos = loc_cache.sync_repos(cache, edges)
+    cached = not force_cache and added_repos == 0 # Only new or flushed repositories start from scratch
     total_repos = len(edges)
-    updated_repos = 0
-    logger.info("LOC cache check started: {total} repositories", total=total_repos)
+    logger.info("LOC cache check started: {total} repositories ({added} new)", total=total_repos, added=added_repos)
 
+    stale_indexes = []
     for index in range(total_repos):
-        repo_hash, commit_count, *__ = data[index].split()
-        repo_full_name = edges[index]['node']['nameWithOwner']
-        if repo_hash == hashlib.sha256(repo_full_name.encode('utf-8')).hexdigest():
-            try:
-                if int(commit_count) != edges[index]['node']['defaultBranchRef']['target']['history']['totalCount']:
-                    # if commit count has changed, update loc for that repo
-                    owner, repo_name = repo_full_name.split('/')
-                    updated_repos += 1
-                    logger.debug("LOC refresh {current}/{total}: {repo}", current=index + 1, total=total_repos, repo=repo_full_name)
-
-                    loc = await recursive_loc(session, owner, repo_name, data, cache_comment)
-                    data[index] = repo_hash + ' ' + str(edges[index]['node']['defaultBranchRef']['target']['history']['totalCount']) + ' ' + str(loc[2]) + ' ' + str(loc[0]) + ' ' + str(loc[1]) + '\n'
-                elif (index + 1) % 25 == 0:
-                    logger.debug("LOC cache check progress: {current}/{total}", current=index + 1, total=total_repos)
-            except TypeError: # If the repo is empty
-                data[index] = repo_hash + ' 0 0 0 0\n'
+        try:
+            if entries[index]['branch_oid'] != edges[index]['node']['defaultBranchRef']['target']['oid'] or 'checkpoint' in entries[index]:
+                # if the default branch head has moved, or a crawl was interrupted, queue that repo for a loc refresh
+                stale_indexes.append(index)
+            elif (index + 1) % 25 == 0:
+                logger.debug("LOC cache check progress: {current}/{total}", current=index + 1, total=total_repos)
+        except TypeError: # If the repo is empty
+            entries[index].pop('checkpoint', None)
+            entries[index].update(loc_cache.empty_entry(entries[index]['name']))
+
+    updated_repos = len(stale_indexes)
+    crawls = {}
+    for index in stale_indexes:
+        if 'checkpoint' in entries[index]:
+            crawls[index] = loc_history.RepoCrawl.from_checkpoint(entries[index]['name'], entries[index]['checkpoint'])
+            logger.info("LOC resuming {repo} from checkpoint ({commits} commits counted)", repo=entries[index]['name'], commits=crawls[index].my_commits)
+            continue
+        # Only walk the commits newer than the last counted one, a force-push that dropped it turns this into a full walk
+        incremental = entries[index]['head_oid'] is not None
+        crawls[index] = loc_history.RepoCrawl(
+            entries[index]['name'],
+            last_oid=entries[index]['head_oid'],
+            page_size=loc_history.expected_page_size(incremental),
+            branch_oid=edges[index]['node']['defaultBranchRef']['target']['oid'],
+        )
+
+    # First pages go out batched, most refreshes only need that one page of new history
+    semaphore = asyncio.Semaphore(max(1, LOC_REFRESH_CONCURRENCY))
+    batches = loc_history.plan_batches(list(crawls.values()), LOC_BATCH_SIZE, LOC_BATCH_COMMITS)
+    await asyncio.gather(*(fetch_history_batch(client, semaphore, batch, cache) for batch in batches))
+    if batches:
+        logger.info("LOC history batches: {batches} requests for {repos} repositories", batches=len(batches), repos=updated_repos)
+        checkpoint_crawls([(crawls[index], entries[index]) for index in stale_indexes if not crawls[index].done], cache)
+
+    await asyncio.gather(*(
+        refresh_repo_loc(client, semaphore, entries[index], crawls[index], cache, position + 1, updated_repos)
+        for position, index in enumerate(stale_indexes)
+    ))
 
     logger.info("LOC cache check finished: {updated}/{total} repositories refreshed", updated=updated_repos, total=total_repos)
-    with open(filename, 'w') as f:
-        f.writelines(cache_comment)
-        f.writelines(data)
-    for line in data:
-        loc = line.split()
-        loc_add += int(loc[3])
-        loc_del += int(loc[4])
-    return [loc_add, loc_del, loc_add - loc_del, cached]
+    loc_cache.save_loc_cache(filename, cache)
+    return loc_cache.LocAggregate(entries, cached)
+
+
+async def refresh_repo_loc(client, semaphore, entry, crawl, cache, position, total):
+    """
+    Finishes the LOC crawl of one repository whose commit count has changed, under the refresh concurrency limit
+    The result is written straight into its own cache entry, so a crash keeps the repos that already finished
+    A crawl resumed from a checkpoint records the branch head it was started for, so a newer head is picked up next run
+    """
+    if not crawl.done:
+        async with semaphore:
+            await recursive_loc(client, crawl, cache, entry)
+    entry.pop('checkpoint', None)
+    if crawl.empty:
+        entry.update(loc_cache.empty_entry(crawl.name_with_owner))
+    elif crawl.reached_last_oid:
+        entry.update(
+            branch_oid=crawl.branch_oid,
+            my_commits=entry['my_commits'] + crawl.my_commits,
+            additions=entry['additions'] + crawl.additions,
+            deletions=entry['deletions'] + crawl.deletions,
+            head_oid=crawl.head_oid,
+        )
+    else:
+        entry.update(
+            branch_oid=crawl.branch_oid,
+            my_commits=crawl.my_commits,
+            additions=crawl.additions,
+            deletions=crawl.deletions,
+            head_oid=crawl.head_oid,
+        )
+    logger.debug("LOC refresh {current}/{total}: {repo} in {elapsed:.2f}s ({mode})", current=position, total=total, repo=crawl.name_with_owner, elapsed=crawl.elapsed, mode='incremental' if crawl.reached_last_oid else 'full scan')
 
 
-def flush_cache(edges, filename, comment_size):
+def flush_cache(cache):
     """
-    Wipes the cache file
-    This is called when the number of repositories changes or when the file is first created
+    Wipes every repository entry of the cache, keeping the comment block
+    This is called when force_cache is set, so every repository is recounted from scratch
     """
-    with open(filename, 'r') as f:
-        data = []
-        if comment_size > 0:
-            data = f.readlines()[:comment_size] # only save the comment
-    with open(filename, 'w') as f:
-        f.writelines(data)
-        for node in edges:
-            f.write(hashlib.sha256(node['node']['nameWithOwner'].encode('utf-8')).hexdigest() + ' 0 0 0 0\n')
+    cache['repos'] = {}
+    cache['legacy'] = {}
 
 
 def add_archive():
@@ -440,15 +573,13 @@ def add_archive():
     return [added_loc, deleted_loc, added_loc - deleted_loc, added_commits, contributed_repos]
 
 
-async def force_close_file(data, cache_comment):
+async def force_close_file(cache):
     """
     Forces the file to close, preserving whatever data was written to it
     This is needed because if this function is called, the program would've crashed before the file is properly saved and closed
     """
-    filename = 'cache/'+hashlib.sha256(USER_NAME.encode('utf-8')).hexdigest()+'.txt'
-    with open(filename, 'w') as f:
-        f.writelines(cache_comment)
-        f.writelines(data)
+    filename = storage.cache_filename(USER_NAME)
+    loc_cache.save_loc_cache(filename, cache)
     logger.exception("Failed writing cache file: {filename}. Partial data saved and file closed.", filename=filename)
 
 
@@ -457,133 +588,18 @@ def stars_counter(data):
     Count total stars in repositories owned by me
     """
     total_stars = 0
-    for node in data: total_stars += node['node']['stargazers']['totalCount']
+    for node in data: total_stars += node['node']['stargazerCount']
     return total_stars
 
 
-def svg_overwrite(filename, lastfm_svg, ascii_svg, github_stats_svg, most_used_lang_svg):
-    """
-    Parse SVG files and update elements with my age, commits, stars, repositories, and lines written
-    """
-    tree = etree.parse(filename)
-    root = tree.getroot()
-
-    def overwrite_identity_header():
-        header_text_candidates = root.xpath("//*[local-name()='text' and @x='390' and @y='30']")
-        header_text = header_text_candidates[0] if header_text_candidates else None
-        if header_text is None:
-            logger.warning("Top identity header not found in {filename}", filename=filename)
-            return
-
-        header_tspan_candidates = header_text.xpath("./*[local-name()='tspan']")
-        header_tspan = header_tspan_candidates[0] if header_tspan_candidates else None
-        if header_tspan is None:
-            logger.warning("Top identity header tspan not found in {filename}", filename=filename)
-            return
-
-        identity_title = SVG_HEADER_IDENTITY
-        header_tspan.text = identity_title
-        header_tspan.tail = make_header_tail(identity_title)
-
-    def normalize_header_tails():
-        header_nodes = root.xpath("//*[local-name()='text' and @x='390']/*[local-name()='tspan' and starts-with(normalize-space(text()), '- ')]")
-        for tspan in header_nodes:
-            title = (tspan.text or '').strip()
-            tspan.tail = make_header_tail(title)
-
-        identity_tspan_nodes = root.xpath("//*[local-name()='text' and @x='390' and @y='30']/*[local-name()='tspan']")
-        if identity_tspan_nodes:
-            identity_tspan_nodes[0].tail = make_header_tail((identity_tspan_nodes[0].text or '').strip())
-
-    def find_element_by_id(element_id):
-        candidates = root.xpath(f"//*[@id='{element_id}']")
-        return candidates[0] if candidates else None
-
-    def ensure_text_fill_by_theme(text_el):
-        if "dark" in filename:
-            text_el.attrib["fill"] = "#c9d1d9"
-        elif "light" in filename:
-            text_el.attrib["fill"] = "#24292f"
-
-    def overwrite_blocks(svg_block, name):
-        new_text_element = etree.fromstring(svg_block)
-        ensure_text_fill_by_theme(new_text_element)
-        old_text_element = find_element_by_id(name)
-
-        if old_text_element is not None:
-            parent = old_text_element.getparent()
-            parent.replace(old_text_element, new_text_element)
-        else:
-            logger.warning("SVG element with id={name} not found", name=name)
-
-    def replace_colors(tree, mapping: dict):
-        for old, new in mapping.items():
-            for el in tree.xpath(f'//*[@fill="{old}"]'):
-                el.attrib["fill"] = new
-
-    overwrite_identity_header()
-    overwrite_blocks(lastfm_svg,"lastfm_block")
-    overwrite_blocks(ascii_svg,"ascii")
-    overwrite_blocks(github_stats_svg,"github_stats")
-    overwrite_blocks(most_used_lang_svg,"languages_block")
-    normalize_header_tails()
-
-    if "dark" in filename:
-        replace_colors(tree, {
-            "#24292f": "#c9d1d9"})
-    elif "light" in filename:
-        replace_colors(tree, {
-            "#c9d1d9": "#24292f"})
-
-    tree.write(filename, encoding='utf-8', xml_declaration=True, )
-
-
-def commit_counter(comment_size):
-    """
-    Counts up my total commits, using the cache file created by cache_builder.
-    """
-    total_commits = 0
-    filename = 'cache/'+hashlib.sha256(USER_NAME.encode('utf-8')).hexdigest()+'.txt' # Use the same filename as cache_builder
-    with open(filename, 'r') as f:
-        data = f.readlines()
-    cache_comment = data[:comment_size] # save the comment block
-    data = data[comment_size:] # remove those lines
-    for line in data:
-        total_commits += int(line.split()[2])
-    return total_commits
-
-
-async def user_getter(session, username):
-    """
-    Returns the account ID and creation time of the user
-    """
-    query_count('user_getter')
-    query = '''
-    query($login: String!){
-        user(login: $login) {
-            id
-            createdAt
-        }
-    }'''
-    variables = {'login': username}
-    request = await simple_request(session, user_getter.__name__, query, variables)
-    return {'id': request['data']['user']['id']}, request['data']['user']['createdAt']
-
-async def follower_getter(session, username):
+def graphql_requester(client, func_name):
     """
-    Returns the number of followers of the user
+    Returns a (query, variables) request function for github_api.paginate, counting every page under func_name
     """
-    query_count('follower_getter')
-    query = '''
-    query($login: String!){
-        user(login: $login) {
-            followers {
-                totalCount
-            }
-        }
-    }'''
-    request = await simple_request(session, follower_getter.__name__, query, {'login': username})
-    return int(request['data']['user']['followers']['totalCount'])
+    async def request(query, variables):
+        query_count(func_name)
+        return await simple_request(client, func_name, query, variables)
+    return request
 
 
 def query_count(funct_id):
@@ -630,93 +646,164 @@ def formatter(query_type, difference, funct_return=False, whitespace=0):
     logger.info('{label}{value}', label='{: <23}'.format('   ' + query_type + ':'), value=value)
     if whitespace:
         return f"{'{:,}'.format(funct_return): <{whitespace}}"
-async def main():
+
+
+def github_client():
+    """
+    Returns the GitHubClient for a run (enter it with async with)
+    """
+    limiter = github_api.RateLimiter(GITHUB_API_CONCURRENCY, GITHUB_API_MAX_CONCURRENCY)
+    return github_api.GitHubClient(ACCESS_TOKEN, PROXY, limiter, connections_per_host=GITHUB_API_MAX_CONCURRENCY)
+
+
+async def main(client=None):
+    """
+    Fetches every metric and rewrites the blocks of both SVGs whose inputs changed
+    The daemon passes its own client, so its open connections are reused across scheduled runs
+    Returns whether any SVG was rewritten or any cache file changed (e.g. a LOC crawl made progress)
+    """
+    if ACCESS_TOKEN is None:
+        load_config()
+    if METRICS_DATA_DIR:
+        os.chdir(METRICS_DATA_DIR)
     logger.info('Calculation times:')
-    async with aiohttp.ClientSession(proxy=PROXY) as session:
-        user_data, user_time = await perf_counter(user_getter, session, USER_NAME)
+    for funct_name in QUERY_COUNT:
+        QUERY_COUNT[funct_name] = 0
+    cache_digests = fingerprint.directory_digests('cache')
+    async with github_client() if client is None else contextlib.nullcontext(client) as client:
         global OWNER_ID
-        OWNER_ID, acc_date = user_data
-        formatter('account data', user_time)
+        state_filename = storage.cache_filename(USER_NAME, 'metrics.json')
+        state = freshness.load_state(state_filename)
+        timings = {}
+        ttls = dict(METRIC_TTLS)
+        cached_owner_id = load_owner_id(USER_NAME)
+        if cached_owner_id is None:
+            ttls['profile'] = 0 # the LOC stage needs the account ID
+
+        async def profile_stats():
+            previous_followers = state['profile']['value']['followers'] if 'profile' in state else None
+            profile, timings['profile calculation'] = await perf_counter(profile_getter, client, USER_NAME, previous_followers)
+            profile['lifetime'] = None
+            if LIFETIME_CONTRIBUTIONS:
+                try:
+                    profile['lifetime'], timings['lifetime contributions'] = await perf_counter(lifetime_contributions, client, profile['created_at'])
+                except Exception:
+                    logger.exception('Lifetime contributions query failed, leaving the row out')
+            return profile
+
+        profile_task = asyncio.create_task(freshness.refresh(state, 'profile', ttls['profile'], profile_stats))
+        if cached_owner_id is not None:
+            OWNER_ID = {'id': cached_owner_id}
+        else:
+            profile, _ = await profile_task
+            OWNER_ID = {'id': profile['id']}
 
         age_data, age_time = await perf_counter(daily_readme, datetime.datetime(2002, 7, 5))
         formatter('age calculation', age_time)
 
+        async def repository_stats():
+            edges, timings['inventory calculation'] = await perf_counter(inventory_query, client, OWNER_AFFILIATIONS)
+            excluded_repos = get_excluded_list(EXCLUDED_REPOS)
+            owned = owned_repositories(edges)
+            (total_loc, loc_time), repo_languages = await asyncio.gather(
+                perf_counter(loc_query, client, edges, 7),
+                language_query(client, [edge['node'] for edge in owned if edge['node']['nameWithOwner'] not in excluded_repos]),
+            )
+            timings['LOC (cached)' if total_loc.cached else 'LOC (no cache)'] = loc_time
+            return {
+                **repository_counts(edges),
+                'commits': total_loc.my_commits,
+                'loc_add': total_loc.additions,
+                'loc_del': total_loc.deletions,
+                'loc_net': total_loc.net,
+                'languages': get_most_used_languages(repo_languages, excluded_languages=get_excluded_list(EXCLUDED_LANGUAGES)),
+            }
+
+        async def lastfm_stats():
+            from lastfm import lastfm_getter
+            scrobbles, timings['lastfm calculation'] = await perf_counter(lastfm_getter, client, LASTFM_TOKEN, LASTFM_USER)
+            return scrobbles
+
         metrics_tasks = [
-            perf_counter(loc_query, session, ['OWNER', 'COLLABORATOR', 'ORGANIZATION_MEMBER'], 7),
-            perf_counter(commit_counter, 7),
-            perf_counter(graph_repos_stars, session, 'stars', ['OWNER']),
-            perf_counter(graph_repos_stars, session, 'repos', ['OWNER']),
-            perf_counter(graph_repos_stars, session, 'repos', ['OWNER', 'COLLABORATOR', 'ORGANIZATION_MEMBER']),
-            perf_counter(follower_getter, session, USER_NAME),
-            perf_counter(lastfm_getter, session, LASTFM_TOKEN, LASTFM_USER),
-            get_recent_commits_and_streak(session),
-            get_most_used_languages(
-                session=session,
-                user_name='xxspell',
-                headers=HEADERS,
-                excluded_repos=get_excluded_list(EXCLUDED_REPOS),
-                excluded_languages=get_excluded_list(EXCLUDED_LANGUAGES),
-            ),
+            freshness.refresh(state, 'repositories', ttls['repositories'], repository_stats),
+            profile_task,
+            freshness.refresh(state, 'lastfm', ttls['lastfm'], lastfm_stats),
         ]
 
         (
-            (total_loc, loc_time),
-            (commit_data, commit_time),
-            (star_data, star_time),
-            (repo_data, repo_time),
-            (contrib_data, contrib_time),
-            (follower_data, follower_time),
-            (lastfm_svg, lastfm_time),
-            (recent_commits, streak),
-            most_used_languages,
+            (repositories, repositories_fetched),
+            (profile, profile_fetched),
+            (scrobbles, lastfm_fetched),
         ) = await asyncio.gather(*metrics_tasks)
 
-        formatter('LOC (cached)', loc_time) if total_loc[-1] else formatter('LOC (no cache)', loc_time)
-        formatter('commit calculation', commit_time)
-        formatter('star calculation', star_time)
-        formatter('repo calculation', repo_time)
-        formatter('contri calculation', contrib_time)
-        formatter('follower calculation', follower_time)
-        formatter('lastfm calculation', lastfm_time)
+        if profile['id'] != OWNER_ID['id']:
+            logger.warning('Saved account ID {saved} does not match {current}, LOC will use the new ID next run', saved=OWNER_ID['id'], current=profile['id'])
+            OWNER_ID = {'id': profile['id']}
+        save_owner_id(USER_NAME, profile['id'])
+        for label, difference in timings.items():
+            formatter(label, difference)
+        fresh = [metric for metric, fetched in (('profile', profile_fetched), ('repositories', repositories_fetched), ('lastfm', lastfm_fetched)) if not fetched]
+        if fresh:
+            logger.info('Reusing stored values for metrics that are not due yet: {metrics}', metrics=', '.join(fresh))
+        follower_data = profile['followers']
+        repo_data, star_data, contrib_data = repositories['repos'], repositories['stars'], repositories['contributed']
+        commit_data = repositories['commits']
+        loc_add, loc_del, loc_net = repositories['loc_add'], repositories['loc_del'], repositories['loc_net']
+        most_used_languages = repositories['languages']
 
         if OWNER_ID == {'id': 'MDQ6VXNlcjc0OTcyMzk'}:
             archived_data = add_archive()
-            for index in range(len(total_loc)-1):
-                total_loc[index] += archived_data[index]
+            loc_add += archived_data[0]
+            loc_del += archived_data[1]
+            loc_net += archived_data[0] - archived_data[1]
             contrib_data += archived_data[-1]
             commit_data += int(archived_data[-2])
 
-        for index in range(len(total_loc)-1):
-            total_loc[index] = '{:,}'.format(total_loc[index])
+        templates = {}
 
-        def ascii_getter():
-            root = etree.parse('dark_mode.svg').getroot()
-            filename = root.get('data-filename')
-            return ascii_to_svg(load_ascii_from_file(get_random_file('arts/', filename)), 15, 30, '#c9d1d9')
+        def svg_template(filename):
+            """
+            Parses each theme file at most once per run (lxml is only loaded when one is needed)
+            """
+            if filename not in templates:
+                from svg_template import SvgTemplate
+                templates[filename] = SvgTemplate(filename)
+            return templates[filename]
 
-        ascii_svg, ascii_time = await perf_counter(ascii_getter)
-        formatter('ascii calculation', ascii_time)
+        def ascii_getter():
+            if 'ascii' in state:
+                previous = state['ascii']['value']
+            else: # first run, the template remembers the art it was last written with
+                previous = svg_template('dark_mode.svg').data_filename
+            return get_random_file('arts/', previous)
+
+        async def ascii_stats():
+            art_path, timings['ascii calculation'] = await perf_counter(ascii_getter)
+            formatter('ascii calculation', timings['ascii calculation'])
+            return art_path
+
+        art_path, _ = await freshness.refresh(state, 'ascii', ttls['ascii'], ascii_stats)
+        if not os.path.isfile(art_path): # removed from arts/ since it was picked
+            del state['ascii']
+            art_path, _ = await freshness.refresh(state, 'ascii', ttls['ascii'], ascii_stats)
+        art = load_ascii_from_file(art_path)
+
+        github_stats_data = {
+            'commit_data': commit_data,
+            'star_data': star_data,
+            'repo_data': repo_data,
+            'contrib_data': contrib_data,
+            'follower_data': follower_data,
+            'loc_total': '{:,}'.format(loc_net),
+            'loc_add': '{:,}'.format(loc_add),
+            'loc_del': '{:,}'.format(loc_del),
+            'recent_commit_data': profile['recent_commits'],
+            'streak_data': profile['streak'],
+            'lifetime_contrib_data': profile['lifetime'] if LIFETIME_CONTRIBUTIONS else None,
+        }
 
         def github_stats_getter():
-            loc_data = total_loc[:-1]
-            return generate_github_stats_svg(
-                x=390,
-                y=390,
-                fill_color='#c9d1d9',
-                commit_data=commit_data,
-                star_data=star_data,
-                repo_data=repo_data,
-                contrib_data=contrib_data,
-                follower_data=follower_data,
-                loc_total=loc_data[2],
-                loc_add=loc_data[0],
-                loc_del=loc_data[1],
-                recent_commit_data=recent_commits,
-                streak_data=streak,
-            )
-
-        github_stats_svg, github_stats_time = await perf_counter(github_stats_getter)
-        formatter('github stats svg calculation', github_stats_time)
+            return generate_github_stats_svg(x=390, y=390, fill_color='#c9d1d9', **github_stats_data)
 
         def most_used_lang_getter():
             return generate_languages_svg(
@@ -726,18 +813,54 @@ async def main():
                 languages=most_used_languages,
             )
 
-        most_used_lang_svg, most_used_lang_time = await perf_counter(most_used_lang_getter)
-        formatter('most lang svg calculation', most_used_lang_time)
-
-        svg_overwrite('dark_mode.svg', lastfm_svg, ascii_svg, github_stats_svg, most_used_lang_svg)
-        svg_overwrite('light_mode.svg', lastfm_svg, ascii_svg, github_stats_svg, most_used_lang_svg)
+        from lastfm import generate_lastfm_svg, scrobble_age
 
-        total_time = user_time + age_time + loc_time + commit_time + star_time + repo_time + contrib_time + lastfm_time + ascii_time + github_stats_time + most_used_lang_time
+        # each block is only rendered, and each file only rewritten, when the inputs it was last written from changed
+        block_renderers = {
+            'lastfm_block': lambda: generate_lastfm_svg(scrobbles),
+            'ascii': lambda: ascii_to_svg(art, 15, 30, '#c9d1d9'),
+            'github_stats': github_stats_getter,
+            'languages_block': most_used_lang_getter,
+        }
+        block_fingerprints = {
+            'header': fingerprint.fingerprint(SVG_HEADER_IDENTITY),
+            'lastfm_block': fingerprint.fingerprint(scrobbles, scrobble_age(scrobbles['summary']['last_scrobble_date']) if scrobbles['summary']['last_scrobble_date'] else None),
+            'ascii': fingerprint.fingerprint(art),
+            'github_stats': fingerprint.fingerprint(github_stats_data),
+            'languages_block': fingerprint.fingerprint(most_used_languages),
+        }
+        fingerprints_filename = storage.cache_filename(USER_NAME, 'fingerprints.json')
+        fingerprints = fingerprint.load_fingerprints(fingerprints_filename)
+        stale = {filename: fingerprint.stale_blocks(fingerprints, filename, block_fingerprints) for filename in SVG_FILES}
+        to_render = set().union(*stale.values())
+
+        render_time = 0
+        rendered = {}
+        for name, renderer in block_renderers.items():
+            if name in to_render:
+                rendered[name], difference = await perf_counter(renderer)
+                formatter(name + ' svg calculation', difference)
+                render_time += difference
+
+        for filename, names in stale.items():
+            if not names:
+                logger.info('{filename} is up to date', filename=filename)
+                continue
+            template = svg_template(filename)
+            template.apply({name: rendered[name] for name in block_renderers if name in names}, SVG_HEADER_IDENTITY)
+            template.write()
+            fingerprint.record_file(fingerprints, filename, block_fingerprints)
+        if to_render:
+            fingerprint.save_fingerprints(fingerprints_filename, fingerprints)
+        freshness.save_state(state_filename, state)
+
+        total_time = sum(timings.values()) + age_time + render_time
         logger.info('{label}{value}', label='{:<21}'.format('Total function time:'), value='{:>11}'.format('%.4f' % total_time) + ' s')
 
         logger.info('Total GitHub GraphQL API calls: {count:>3}', count=sum(QUERY_COUNT.values()))
         for funct_name, count in QUERY_COUNT.items():
             logger.info('{name:<28} {count:>6}', name='   ' + funct_name + ':', count=count)
+        return bool(to_render) or fingerprint.directory_digests('cache') != cache_digests
 
 
 